@@ -2,12 +2,24 @@
 # Import required libraries
 # ===============================
 from dotenv import load_dotenv       # For loading environment variables from a .env file
-from openai import OpenAI            # OpenAI API client
-import json                          # For parsing tool arguments from JSON
+from providers import client         # Shared, pooled API clients
+from rate_limits import scheduler    # Per-provider rate limits + retries
+from hedging import chat as hedged_chat   # Hedging + failover to backup providers
 import os                            # For accessing environment variables
-import requests                      # For making HTTP requests (used with Pushover)
-from pypdf import PdfReader          # For extracting text from your LinkedIn PDF
+import asyncio                       # Async chat path (one event loop, many sessions)
+import time                          # For time-to-first-token measurements
+from types import SimpleNamespace    # For rebuilding streamed tool calls
+from typing import Annotated         # Parameter descriptions for tool schemas
+from tools import ToolRegistry       # Tool schemas + parallel tool execution
+from notifications import NotificationDispatcher   # Non-blocking Pushover sender
+from profile_context import load_profile_context   # Cached LinkedIn/summary/document text
 import gradio as gr                  # For creating a web-based chatbot interface
+from prompts import PromptBuilder, context_section, count_tokens, report_usage   # Cached prompt prefix
+from history import HistoryManager, llm_summarizer   # Token-budgeted history
+from retrieval import CONTEXT_MODE, ProfileRetriever   # Top-k profile chunks per request
+from response_cache import ResponseCache   # Cached replies to repeated questions
+from sessions import SessionStore, session_id_of   # Server-side conversation history
+from tracing import activate, current_span, span, start_metrics_server, start_span, traced   # Spans + metrics
 
 
 # ===============================
@@ -15,29 +27,43 @@ import gradio as gr                  # For creating a web-based chatbot interfac
 # ===============================
 load_dotenv(override=True)           # Reads the .env file and sets environment variables
 
+# Serving: how many chats Gradio runs at once per process, and how many processes
+CONCURRENCY = int(os.getenv("GRADIO_CONCURRENCY", "256"))
+WORKERS = int(os.getenv("CHAT_WORKERS", "1"))
+
+# Between the text of two model rounds of one reply (before and after a tool call)
+ROUND_SEPARATOR = "\n\n"
+
 
 # ===============================
 # Function: Send Pushover notification
 # ===============================
+notifier = NotificationDispatcher()  # Background sender shared by all tool calls
+
 def push(text):
     """
-    Sends a notification message via Pushover API.
+    Queues a notification message for the Pushover API and returns immediately.
     Requires PUSHOVER_TOKEN and PUSHOVER_USER in your .env file.
     """
-    requests.post(
-        "https://api.pushover.net/1/messages.json",
-        data={
-            "token": os.getenv("PUSHOVER_TOKEN"),   # Your Pushover app token
-            "user": os.getenv("PUSHOVER_USER"),     # Your Pushover user key
-            "message": text,                        # Message content
-        }
-    )
+    notifier.send(text)
+
+
+# ===============================
+# Tool registry for GPT function calling
+# ===============================
+# The JSON schema for each tool is generated from its signature (see tools.py)
+registry = ToolRegistry()
 
 
 # ===============================
 # Function: Record user details
 # ===============================
-def record_user_details(email, name="Name not provided", notes="not provided"):
+@registry.tool(description="Use this tool to record that a user is interested in being in touch and provided an email address")
+async def record_user_details(
+    email: Annotated[str, "The email address of this user"],                        # Email is mandatory
+    name: Annotated[str, "The user's name, if they provided it"] = "Name not provided",
+    notes: Annotated[str, "Any additional context about the user"] = "not provided",
+):
     """
     Records user contact details and sends a push notification.
     """
@@ -48,7 +74,8 @@ def record_user_details(email, name="Name not provided", notes="not provided"):
 # ===============================
 # Function: Record unknown questions
 # ===============================
-def record_unknown_question(question):
+@registry.tool(description="Always use this tool to record any question that couldn't be answered")
+async def record_unknown_question(question: Annotated[str, "The question that couldn't be answered"]):
     """
     Records a question the AI couldn't answer.
     """
@@ -60,41 +87,53 @@ def record_unknown_question(question):
 # Tool definitions for GPT function calling
 # ===============================
 
-# Schema for recording user details
-record_user_details_json = {
-    "name": "record_user_details",
-    "description": "Use this tool to record that a user is interested in being in touch and provided an email address",
-    "parameters": {
-        "type": "object",
-        "properties": {
-            "email": { "type": "string", "description": "The email address of this user" },
-            "name": { "type": "string", "description": "The user's name, if they provided it" },
-            "notes": { "type": "string", "description": "Any additional context about the user" }
-        },
-        "required": ["email"],             # Email is mandatory
-        "additionalProperties": False      # No extra fields allowed
-    }
-}
-
-# Schema for recording unknown questions
-record_unknown_question_json = {
-    "name": "record_unknown_question",
-    "description": "Always use this tool to record any question that couldn't be answered",
-    "parameters": {
-        "type": "object",
-        "properties": {
-            "question": { "type": "string", "description": "The question that couldn't be answered" },
-        },
-        "required": ["question"],          # Question text is mandatory
-        "additionalProperties": False
-    }
-}
+# Generated schemas (kept under their old names)
+record_user_details_json = registry.schemas["record_user_details"]
+record_unknown_question_json = registry.schemas["record_unknown_question"]
 
 # List of tools available to GPT
-tools = [
-    {"type": "function", "function": record_user_details_json},
-    {"type": "function", "function": record_unknown_question_json}
-]
+tools = registry.openai_tools()
+
+
+# ===============================
+# Helpers for streamed tool calls
+# ===============================
+def merge_tool_call_deltas(calls, delta):
+    """
+    Tool call arguments arrive in fragments keyed by index; stitch them together.
+    """
+    for part in delta.tool_calls or []:
+        call = calls.setdefault(part.index, {"id": "", "name": "", "arguments": ""})
+        if part.id:
+            call["id"] = part.id
+        if part.function and part.function.name:
+            call["name"] += part.function.name
+        if part.function and part.function.arguments:
+            call["arguments"] += part.function.arguments
+
+
+def assembled_tool_calls(calls):
+    """
+    Turns the stitched fragments into tool_call-like objects, in index order.
+    """
+    return [
+        SimpleNamespace(id=c["id"], function=SimpleNamespace(name=c["name"], arguments=c["arguments"]))
+        for _, c in sorted(calls.items())
+    ]
+
+
+def assistant_tool_message(content, tool_calls):
+    """
+    The assistant turn that requested the tool calls, as a plain message dict.
+    """
+    return {
+        "role": "assistant",
+        "content": content or None,
+        "tool_calls": [
+            {"id": c.id, "type": "function", "function": {"name": c.function.name, "arguments": c.function.arguments}}
+            for c in tool_calls
+        ]
+    }
 
 
 # ===============================
@@ -105,24 +144,38 @@ class Me:
     def __init__(self):
         """
         Initialize the AI persona:
-        - Load OpenAI client
-        - Extract LinkedIn text from PDF
-        - Load career summary from text file
+        - Get the shared OpenAI client
+        - Load LinkedIn text and career summary (via the shared profile cache)
+
+        Nothing on Me is per-conversation (history arrives with each call and
+        the caches are thread-safe), so one instance serves every session.
         """
-        self.openai = OpenAI()                  # OpenAI client
+        self.openai = client("openai")          # Shared OpenAI client
         self.name = "Nidhish Malav"                 # Persona name
+        self.stream = os.getenv("CHAT_STREAM", "1") == "1"   # Stream tokens to the UI
+
+        # Load LinkedIn text and career summary (extracted once, cached on disk)
+        profile = load_profile_context()
+        self.linkedin = profile.linkedin        # LinkedIn profile text
+        self.summary = profile.summary          # Career summary text
+        self.documents = profile.documents      # Resumes, write-ups etc. from PROFILE_DOCS_DIR
+
+        # In retrieval mode only the relevant chunks are sent with each request
+        self.context_mode = CONTEXT_MODE
+        self.retriever = ProfileRetriever(profile) if self.context_mode == "retrieval" else None
+
+        # Replies to repeated questions are served from cache (tool turns are never cached)
+        self.cache = ResponseCache("me", profile.content_hash)
+
+        # Older turns are folded into a rolling summary to stay within budget
+        self.history = HistoryManager(llm_summarizer(self.openai))
 
-        # Load LinkedIn PDF
-        reader = PdfReader("linkedin.pdf")
-        self.linkedin = ""                      # Store LinkedIn profile text
-        for page in reader.pages:
-            text = page.extract_text()          # Extract text from each page
-            if text:
-                self.linkedin += text           # Append to linkedin text
+        # Conversations are kept server-side per session (tool messages included)
+        self.sessions = SessionStore("me")
 
-        # Load career summary
-        with open("summary.txt", "r", encoding="utf-8") as f:
-            self.summary = f.read()
+        # Build the static system prompt once; it is reused byte-for-byte
+        self.prompt = self.build_prompt()
+        print(f"System prompt prefix: {self.prompt.prefix_tokens} tokens", flush=True)
 
 
     # ===============================
@@ -132,33 +185,27 @@ class Me:
         """
         Executes GPT tool calls and returns results to the conversation.
         """
-        results = []
-        for tool_call in tool_calls:
-            tool_name = tool_call.function.name                  # Which tool was called
-            arguments = json.loads(tool_call.function.arguments) # Parse arguments JSON
-            print(f"Tool called: {tool_name}", flush=True)
+        # Independent calls run concurrently; results keep tool_call order
+        return registry.handle_tool_calls(tool_calls)
 
-            # Find the actual Python function matching tool_name
-            tool = globals().get(tool_name)
-            result = tool(**arguments) if tool else {}           # Run tool if found
 
-            # Return result back to GPT
-            results.append({
-                "role": "tool",
-                "content": json.dumps(result),
-                "tool_call_id": tool_call.id
-            })
-        return results
+    async def ahandle_tool_call(self, tool_calls):
+        """
+        Async version of handle_tool_call (async tools run on the event loop).
+        """
+        return await registry.ahandle_tool_calls(tool_calls)
 
 
     # ===============================
     # System prompt for GPT
     # ===============================
-    def system_prompt(self):
+    def build_prompt(self):
         """
-        Creates the system prompt that sets GPT's behavior as "Ed Donner".
+        Creates the prompt builder that sets GPT's behavior as "Ed Donner".
+        The whole system prompt is static, so providers can cache it.
+        In retrieval mode the profile context is left out and added per request.
         """
-        system_prompt = f"You are acting as {self.name}. You are answering questions on {self.name}'s website, \
+        intro = f"You are acting as {self.name}. You are answering questions on {self.name}'s website, \
 particularly questions related to {self.name}'s career, background, skills and experience. \
 Your responsibility is to represent {self.name} for interactions on the website as faithfully as possible. \
 You are given a summary of {self.name}'s background and LinkedIn profile which you can use to answer questions. \
@@ -167,57 +214,389 @@ If you don't know the answer to any question, use your record_unknown_question t
 If the user is engaging in discussion, try to steer them towards getting in touch via email; \
 ask for their email and record it using your record_user_details tool. "
 
-        # Add summary and LinkedIn text for GPT's context
-        system_prompt += f"\n\n## Summary:\n{self.summary}\n\n## LinkedIn Profile:\n{self.linkedin}\n\n"
-        system_prompt += f"With this context, please chat with the user, always staying in character as {self.name}."
+        # Summary and LinkedIn text sit between the intro and the closing line
+        closing = f"With this context, please chat with the user, always staying in character as {self.name}."
 
-        return system_prompt
+        if self.retriever:
+            return PromptBuilder(intro, "\n\n", closing)
+        return PromptBuilder(intro, context_section(self.summary, self.linkedin, self.documents), closing)
+
+
+    def system_prompt(self):
+        """
+        Returns the static system prompt (computed once in build_prompt).
+        """
+        return self.prompt.prefix
+
+
+    def extra_context(self, message, history):
+        """
+        Per-request context: the retrieved profile excerpts (retrieval mode only).
+        """
+        return self.retriever.context_for(message, history) if self.retriever else None
+
+
+    def build_messages(self, message, history):
+        """
+        Full message list for GPT: static prompt, compacted history, extra context, user message.
+        """
+        extra = self.extra_context(message, history)
+        reserved = self.prompt.prefix_tokens + count_tokens(message) + (count_tokens(extra) if extra else 0)
+        return self.prompt.messages(message, self.history.fit(history, reserved), extra=extra)
+
+
+    def remember_turn(self, session_id, message, turn_messages, reply):
+        """
+        Appends this turn (user message, tool rounds, final reply) to the session.
+        """
+        self.sessions.append(session_id, {"role": "user", "content": message},
+                             *turn_messages, {"role": "assistant", "content": reply})
 
 
     # ===============================
     # Chat method (core conversation loop)
     # ===============================
-    def chat(self, message, history):
+    @traced("me.chat", kind="chat")
+    def chat(self, message, history, request: gr.Request = None):
         """
         Handles chat conversation:
-        - Builds message history
+        - Builds message history (from the server-side session if there is one)
         - Sends to GPT
         - Handles tool calls if GPT invokes them
         - Returns final response to user
         """
+        session_id = session_id_of(request)
+        history = self.sessions.history(session_id, history)
+
+        # Repeated question? Answer from cache
+        cached = self.cache.get(message, history)
+        if cached is not None:
+            current_span().set(cache="hit")
+            self.remember_turn(session_id, message, [], cached)
+            return cached
+
         # Build conversation with system, past history, and new user input
-        messages = [{"role": "system", "content": self.system_prompt()}] + history + [{"role": "user", "content": message}]
+        messages = self.build_messages(message, history)
+        turn_start = len(messages)
 
+        used_tools = False
         done = False
         while not done:
             # Call GPT with tools enabled
-            response = self.openai.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=messages,
-                tools=tools
-            )
+            # (a slow or failing gpt-4o-mini is hedged with a backup provider)
+            with span("chat.completion", kind="model", provider="openai", model="gpt-4o-mini") as s:
+                response = hedged_chat.create_sync(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    tools=tools
+                )
+                s.record_usage(response.usage)
+            report_usage("chat", response.usage)
 
             # If GPT wants to use a tool
             if response.choices[0].finish_reason == "tool_calls":
-                message = response.choices[0].message
-                tool_calls = message.tool_calls
+                assistant = response.choices[0].message
+                tool_calls = assistant.tool_calls
 
                 # Run the tool and append result to conversation
                 results = self.handle_tool_call(tool_calls)
-                messages.append(message)
+                messages.append(assistant)
                 messages.extend(results)
+                used_tools = True
 
             else:
                 # GPT finished answering
                 done = True
 
-        # Return GPT’s final reply text
-        return response.choices[0].message.content
+        # Return GPT’s final reply text (cached unless a tool ran)
+        reply = response.choices[0].message.content
+        if used_tools:
+            self.cache.bypass()
+        else:
+            self.cache.put(message, history, reply)
+        self.remember_turn(session_id, message, messages[turn_start:], reply)
+        return reply
+
+
+    # ===============================
+    # Streaming chat method
+    # ===============================
+    def chat_stream(self, message, history, request: gr.Request = None):
+        """
+        Same conversation loop as chat(), but yields the reply as it streams in:
+        - Text deltas are yielded straight away (Gradio shows partial text)
+        - Tool call deltas are stitched together and run when the round ends
+        - The next round keeps streaming after the tool results are added
+        """
+        # Spans are finished by hand: a `with` block can't safely span yields
+        turn = start_span("me.chat_stream", kind="chat")
+        try:
+            session_id = session_id_of(request)
+            history = self.sessions.history(session_id, history)
+
+            cached = self.cache.get(message, history)
+            if cached is not None:
+                turn.set(cache="hit")
+                self.remember_turn(session_id, message, [], cached)
+                yield cached
+                return
+
+            messages = self.build_messages(message, history)
+            turn_start = len(messages)
+            reply = ""                                  # Everything shown to the user so far
+            used_tools = False
+
+            done = False
+            while not done:
+                call_span = start_span("chat.completion", kind="model", provider="openai", model="gpt-4o-mini", parent=turn)
+                stream = scheduler.call(
+                    "openai", self.openai.chat.completions.create,
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    tools=tools,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+
+                content = ""                            # Text produced in this round
+                calls = {}                              # Tool calls being assembled, by index
+                finish_reason = None
+                for chunk in stream:
+                    if chunk.usage:
+                        report_usage("chat", chunk.usage)   # Final chunk carries usage
+                        call_span.record_usage(chunk.usage)
+                    if not chunk.choices:
+                        continue
+                    choice = chunk.choices[0]
+                    delta = choice.delta
+
+                    if delta.content:
+                        if not content:
+                            call_span.set(ttft_ms=round((time.perf_counter() - call_span.started) * 1000, 1))
+                            if reply:
+                                reply += ROUND_SEPARATOR
+                        content += delta.content
+                        reply += delta.content
+                        yield reply
+
+                    merge_tool_call_deltas(calls, delta)
+                    if choice.finish_reason:
+                        finish_reason = choice.finish_reason
+                call_span.finish()
+
+                if finish_reason == "tool_calls" and calls:
+                    tool_calls = assembled_tool_calls(calls)
+
+                    # Run the tools and append the assistant turn plus results
+                    with activate(turn):
+                        results = self.handle_tool_call(tool_calls)
+                    messages.append(assistant_tool_message(content, tool_calls))
+                    messages.extend(results)
+                    used_tools = True
+
+                else:
+                    done = True
+
+            if used_tools:
+                self.cache.bypass()
+            else:
+                self.cache.put(message, history, reply)
+            self.remember_turn(session_id, message, messages[turn_start:], reply)   # Stored as shown
+
+            if not reply:
+                yield reply
+        except Exception as e:
+            turn.finish(e)
+            raise
+        finally:
+            turn.finish()
+
+
+
+    # ===============================
+    # Async chat methods (used by the web UI)
+    # ===============================
+    # Same loops as chat() / chat_stream(), but on AsyncOpenAI: a conversation
+    # waiting on the network holds no thread, so one event loop can carry
+    # hundreds of sessions. Gradio runs async functions on its own loop.
+    async def achat(self, message, history, request: gr.Request = None):
+        """
+        Async version of chat().
+        """
+        reply = ""
+        async for reply in self.achat_stream(message, history, request, stream=False):
+            pass
+        return reply
+
+
+    async def achat_stream(self, message, history, request: gr.Request = None, stream=True):
+        """
+        Async version of chat_stream(); with stream=False each round is one
+        non-streamed completion and only the final reply is yielded.
+        """
+        turn = start_span("me.achat_stream", kind="chat")
+        try:
+            session_id = session_id_of(request)
+            history = await asyncio.to_thread(self.sessions.history, session_id, history)
+
+            # The cache stats the profile files and may hit SQLite: keep it off the loop too
+            cached = await asyncio.to_thread(self.cache.get, message, history)
+            if cached is not None:
+                turn.set(cache="hit")
+                await asyncio.to_thread(self.remember_turn, session_id, message, [], cached)
+                yield cached
+                return
+
+            # May call the summary model, which is blocking: keep it off the loop
+            with activate(turn):
+                messages = await asyncio.to_thread(self.build_messages, message, history)
+            turn_start = len(messages)
+            reply = ""
+            used_tools = False
+
+            done = False
+            while not done:
+                call_span = start_span("chat.completion", kind="model", provider="openai", model="gpt-4o-mini", parent=turn)
+                content = ""
+                calls = {}
+                finish_reason = None
+                # The first token is raced against backup providers (see hedging.py)
+                if stream:
+                    response = hedged_chat.stream(
+                        trace=call_span,
+                        model="gpt-4o-mini",
+                        messages=messages,
+                        tools=tools
+                    )
+                    async for chunk in response:
+                        if chunk.usage:
+                            report_usage("chat", chunk.usage)
+                            call_span.record_usage(chunk.usage)
+                        if not chunk.choices:
+                            continue
+                        choice = chunk.choices[0]
+                        if choice.delta.content:
+                            if not content:
+                                call_span.set(ttft_ms=round((time.perf_counter() - call_span.started) * 1000, 1))
+                                if reply:
+                                    reply += ROUND_SEPARATOR
+                            content += choice.delta.content
+                            reply += choice.delta.content
+                            yield reply
+                        merge_tool_call_deltas(calls, choice.delta)
+                        if choice.finish_reason:
+                            finish_reason = choice.finish_reason
+                else:
+                    response = await hedged_chat.create(
+                        trace=call_span,
+                        model="gpt-4o-mini",
+                        messages=messages,
+                        tools=tools
+                    )
+                    report_usage("chat", response.usage)
+                    call_span.record_usage(response.usage)
+                    choice = response.choices[0]
+                    finish_reason = choice.finish_reason
+                    content = choice.message.content or ""
+                    for index, call in enumerate(choice.message.tool_calls or []):
+                        calls[index] = {"id": call.id, "name": call.function.name, "arguments": call.function.arguments}
+                    if content and reply:
+                        reply += ROUND_SEPARATOR
+                    reply += content
+                call_span.finish()
+
+                if finish_reason == "tool_calls" and calls:
+                    tool_calls = assembled_tool_calls(calls)
+                    with activate(turn):
+                        results = await self.ahandle_tool_call(tool_calls)
+                    messages.append(assistant_tool_message(content, tool_calls))
+                    messages.extend(results)
+                    used_tools = True
+                else:
+                    done = True
+
+            if used_tools:
+                self.cache.bypass()
+            else:
+                await asyncio.to_thread(self.cache.put, message, history, reply)
+            await asyncio.to_thread(self.remember_turn, session_id, message, messages[turn_start:], reply)
+
+            if not stream or not reply:
+                yield reply
+        except Exception as e:
+            turn.finish(e)
+            raise
+        finally:
+            turn.finish()
+
+
+# ===============================
+# Web UI and multi-process serving
+# ===============================
+def build_ui(me):
+    """
+    Gradio chat UI on the async chat path, with a queue sized for many sessions.
+    """
+    chat_fn = me.achat_stream if me.stream else me.achat   # Async generator => Gradio streams
+    demo = gr.ChatInterface(chat_fn, type="messages", concurrency_limit=CONCURRENCY)
+    return demo.queue(default_concurrency_limit=CONCURRENCY)
+
+
+def create_app():
+    """
+    FastAPI app for multi-process serving (one per uvicorn worker):
+    - /          the Gradio UI
+    - /api/chat  streaming endpoint, POST {"message": ..., "session_id": ...}
+                 (with a session id the server keeps the history; without one,
+                 send {"history": [...]} as before)
+    - /metrics   this worker's Prometheus metrics
+
+    Gradio's queue lives in each process, so with several workers the UI
+    needs a load balancer with sticky sessions; /api/chat works on any worker
+    (sessions are shared through the SQLite session store).
+    """
+    from fastapi import Body, FastAPI
+    from fastapi.responses import PlainTextResponse, StreamingResponse
+
+    from tracing import metrics
+
+    me = Me()
+    app = FastAPI()
+
+    @app.post("/api/chat")
+    async def api_chat(message: str = Body(...), history: list = Body(default=None), session_id: str = Body(default=None)):
+        request = SimpleNamespace(session_hash=session_id) if session_id else None
+
+        async def deltas():
+            sent = ""
+            async for reply in me.achat_stream(message, history, request):
+                yield reply[len(sent):]
+                sent = reply
+        return StreamingResponse(deltas(), media_type="text/plain; charset=utf-8")
+
+    @app.get("/metrics")
+    def prometheus():
+        return PlainTextResponse(metrics.render())
+
+    return gr.mount_gradio_app(app, build_ui(me), path="/")
 
 
 # ===============================
-# Launch chatbot with Gradio UI
+# Launch chatbot
 # ===============================
+# CHAT_WORKERS=1 (default): one process, Gradio's own server.
+# CHAT_WORKERS=N: N uvicorn worker processes sharing one port.
+def main():
+    host = os.getenv("GRADIO_SERVER_NAME", "127.0.0.1")
+    port = int(os.getenv("GRADIO_SERVER_PORT", "7860"))
+    if WORKERS > 1:
+        import uvicorn
+
+        uvicorn.run("MyChatBot:create_app", factory=True, host=host, port=port, workers=WORKERS)
+    else:
+        start_metrics_server()                        # Prometheus /metrics if METRICS_PORT is set
+        build_ui(Me()).launch(server_name=host, server_port=port)   # Launch web UI for chatting
+
+
 if __name__ == "__main__":
-    me = Me()                                         # Create AI persona
-    gr.ChatInterface(me.chat, type="messages").launch()  # Launch web UI for chatting
+    main()
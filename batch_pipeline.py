@@ -0,0 +1,347 @@
+# ======================================
+# Offline batch pipeline for the competition
+# ======================================
+# Competitor answers and judge rankings are not interactive, so instead of
+# the synchronous chat endpoint they can go through a batch API (cheaper,
+# and outside the interactive rate limits):
+#
+#   1. write one batch-format JSONL file of competitor requests per provider
+#   2. submit each file through a backend and poll until it completes
+#   3. ingest the answers, write the judge requests, submit and poll again
+#   4. ingest the rankings and print the leaderboard
+#
+# Results land in the same JSONL checkpoint as competition_batch.py, and the
+# submitted batch ids are kept next to it, so an interrupted run resumes
+# polling instead of paying for the same batch twice.
+#
+# Backends:
+#   local   runs the requests itself through the normal clients at BATCH
+#           priority and writes the output file; for testing, and for
+#           every provider not in BATCH_API_PROVIDERS
+#   openai  the OpenAI Batch API, for the providers in BATCH_API_PROVIDERS
+#           (add a provider there once its endpoint implements /v1/batches)
+#
+#   python batch_pipeline.py --questions questions.txt --backend local
+#   python batch_pipeline.py --questions questions.txt --backend openai --poll 60
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from competition import (COMPETITORS, JUDGE_MODEL, Competitor, ask, judge_prompt,
+                         parse_ranking)
+from competition_batch import CHECKPOINT, Checkpoint, add_questions, leaderboard, print_leaderboard, read_questions
+from providers import PROVIDERS, async_client, client
+from rate_limits import BATCH, scheduler
+
+BATCH_DIR = Path(os.getenv("BATCH_DIR", ".cache/batches"))
+POLL_SECONDS = 30.0
+ENDPOINT = "/v1/chat/completions"
+BATCH_API_PROVIDERS = ("openai",)    # Providers known to implement /v1/batches
+
+
+def batch_request(custom_id, model, messages):
+    """
+    One line of a batch input file.
+    """
+    return {"custom_id": custom_id, "method": "POST", "url": ENDPOINT,
+            "body": {"model": model, "messages": messages}}
+
+
+def response_text(record):
+    """
+    Reply text from one line of a batch output file (None if it failed).
+    """
+    response = record.get("response") or {}
+    if record.get("error") or response.get("status_code") != 200:
+        return None
+    return response["body"]["choices"][0]["message"]["content"]
+
+
+# ---------------------------
+# Backends
+# ---------------------------
+class LocalBatchBackend:
+    """
+    File-based stand-in for a batch API: runs the requests in a background
+    thread through the regular clients and writes an output JSONL file.
+    """
+
+    name = "local"
+
+    def __init__(self, root=BATCH_DIR, concurrency=8):
+        self.root = Path(root)
+        self.concurrency = concurrency
+        self.threads = {}
+
+    def submit(self, provider, path):
+        batch_id = f"local_{uuid.uuid4().hex[:12]}"
+        folder = self.root / batch_id
+        folder.mkdir(parents=True, exist_ok=True)
+        shutil.copy(path, folder / "input.jsonl")
+        (folder / "provider").write_text(provider)
+        self._start(batch_id)
+        return batch_id
+
+    def status(self, provider, batch_id):
+        folder = self.root / batch_id
+        if (folder / "output.jsonl").exists():
+            return "completed"
+        if not folder.exists():
+            return "failed"
+        if batch_id not in self.threads:              # Interrupted by a restart: pick it up again
+            self._start(batch_id)
+        return "in_progress"
+
+    def results(self, provider, batch_id):
+        with open(self.root / batch_id / "output.jsonl", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def _start(self, batch_id):
+        thread = threading.Thread(target=lambda: asyncio.run(self._run(batch_id)), name=batch_id, daemon=True)
+        self.threads[batch_id] = thread
+        thread.start()
+
+    async def _run(self, batch_id):
+        folder = self.root / batch_id
+        provider = (folder / "provider").read_text()
+        with open(folder / "input.jsonl", encoding="utf-8") as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def run(request):
+            async with limit:
+                body = request["body"]
+                try:
+                    if PROVIDERS[provider].sdk == "anthropic":
+                        text = await ask(async_client(provider), Competitor(body["model"], provider), body["messages"])
+                        result = {"choices": [{"index": 0, "message": {"role": "assistant", "content": text}}]}
+                    else:
+                        response = await scheduler.acall(provider, async_client(provider).chat.completions.create,
+                                                         priority=BATCH, **body)
+                        result = response.model_dump()
+                    return {"custom_id": request["custom_id"], "response": {"status_code": 200, "body": result}, "error": None}
+                except Exception as e:
+                    return {"custom_id": request["custom_id"], "response": None,
+                            "error": {"message": f"{type(e).__name__}: {e}"}}
+
+        records = await asyncio.gather(*(run(r) for r in requests))
+        partial = folder / "output.jsonl.partial"
+        partial.write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+        partial.replace(folder / "output.jsonl")        # Appears complete or not at all
+
+
+class OpenAIBatchBackend:
+    """
+    The OpenAI Batch API (files + batches endpoints).
+    """
+
+    name = "openai"
+    stopped = ("failed", "expired", "cancelling", "cancelled")
+
+    def submit(self, provider, path):
+        api = client(provider)
+        with open(path, "rb") as f:
+            uploaded = api.files.create(file=f, purpose="batch")
+        batch = api.batches.create(input_file_id=uploaded.id, endpoint=ENDPOINT, completion_window="24h")
+        return batch.id
+
+    def status(self, provider, batch_id):
+        status = client(provider).batches.retrieve(batch_id).status
+        if status == "completed":
+            return status
+        return "failed" if status in self.stopped else "in_progress"
+
+    def results(self, provider, batch_id):
+        api = client(provider)
+        batch = api.batches.retrieve(batch_id)
+        records = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                records += [json.loads(line) for line in api.files.content(file_id).text.splitlines() if line.strip()]
+        return records
+
+
+BACKENDS = {"local": LocalBatchBackend, "openai": OpenAIBatchBackend}
+
+
+# ---------------------------
+# Pipeline
+# ---------------------------
+class BatchPipeline:
+    """
+    Competitor batches -> judge batch -> leaderboard, resumable from disk.
+    """
+
+    def __init__(self, backend, checkpoint, competitors=COMPETITORS, judge_model=JUDGE_MODEL,
+                 poll_seconds=POLL_SECONDS, workdir=BATCH_DIR):
+        self.backend = backend
+        self.local = backend if isinstance(backend, LocalBatchBackend) else LocalBatchBackend(workdir)
+        self.checkpoint = checkpoint
+        self.competitors = competitors
+        self.judge_model = judge_model
+        self.poll_seconds = poll_seconds
+        self.workdir = Path(workdir)
+        self.state_path = Path(f"{checkpoint.path}.batches.json")
+        self.state = json.loads(self.state_path.read_text()) if self.state_path.exists() else {"batches": []}
+
+    def save_state(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        self.state_path.write_text(json.dumps(self.state, indent=2))
+
+    def backend_for(self, provider):
+        """
+        Providers without a known OpenAI-format batch endpoint always run locally.
+        """
+        return self.backend if provider in BATCH_API_PROVIDERS else self.local
+
+    # ---------------------------
+    # Writing and submitting
+    # ---------------------------
+    def submit(self, stage, provider, requests):
+        if not requests:
+            return
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        path = self.workdir / f"{stage}-{provider}-{uuid.uuid4().hex[:8]}.jsonl"
+        path.write_text("".join(json.dumps(r) + "\n" for r in requests), encoding="utf-8")
+        backend = self.backend_for(provider)
+        batch_id = backend.submit(provider, str(path))
+        self.state["batches"].append({"stage": stage, "provider": provider, "backend": backend.name,
+                                      "batch_id": batch_id, "input": str(path), "ingested": False,
+                                      "custom_ids": [r["custom_id"] for r in requests]})
+        self.save_state()
+        print(f"Submitted {len(requests)} {stage} requests to {provider} ({backend.name} batch {batch_id})", flush=True)
+
+    def in_flight(self, stage):
+        """
+        custom_ids already submitted in a batch that has not been ingested yet.
+        """
+        return {cid for b in self.state["batches"] if b["stage"] == stage and not b["ingested"] for cid in b["custom_ids"]}
+
+    def submit_competitors(self, qids):
+        pending = self.in_flight("competitors")
+        by_provider = defaultdict(list)
+        for qid in qids:
+            question = self.checkpoint.questions[qid]["question"]
+            answered = self.checkpoint.answers.get(qid, {})
+            for competitor in self.competitors:
+                custom_id = f"{qid}|{competitor.model}"
+                if competitor.model in answered or custom_id in pending:
+                    continue
+                by_provider[competitor.provider].append(
+                    batch_request(custom_id, competitor.model, [{"role": "user", "content": question}])
+                )
+        for provider, requests in by_provider.items():
+            self.submit("competitors", provider, requests)
+
+    def submit_judging(self, qids):
+        pending = self.in_flight("judge")
+        requests = []
+        for qid in qids:
+            answered = self.checkpoint.answers.get(qid, {})
+            models = [c.model for c in self.competitors if c.model in answered]
+            if len(models) < 2 or self.checkpoint.judged(qid, models) or qid in pending:
+                continue
+            prompt = judge_prompt(self.checkpoint.questions[qid]["question"], [answered[m]["answer"] for m in models])
+            requests.append(batch_request(qid, self.judge_model, [{"role": "user", "content": prompt}]))
+            self.state.setdefault("judged_models", {})[qid] = models
+        self.submit("judge", "openai", requests)
+
+    # ---------------------------
+    # Polling and ingesting
+    # ---------------------------
+    def wait(self, stage):
+        """
+        Polls the stage's batches until all of them are done, ingesting each as it completes.
+        """
+        while True:
+            open_batches = [b for b in self.state["batches"] if b["stage"] == stage and not b["ingested"]]
+            if not open_batches:
+                return
+            for batch in open_batches:
+                backend = self.local if batch["backend"] == "local" else self.backend
+                status = backend.status(batch["provider"], batch["batch_id"])
+                if status == "completed":
+                    self.ingest(batch, backend.results(batch["provider"], batch["batch_id"]))
+                elif status == "failed":
+                    print(f"Batch {batch['batch_id']} failed; its requests will be resubmitted next run", flush=True)
+                    batch["ingested"] = True
+                    self.save_state()
+            if any(not b["ingested"] for b in open_batches):
+                time.sleep(self.poll_seconds)
+
+    def ingest(self, batch, records):
+        failed = 0
+        for record in records:
+            text = response_text(record)
+            if text is None:
+                failed += 1
+                continue
+            if batch["stage"] == "competitors":
+                qid, model = record["custom_id"].split("|", 1)
+                self.checkpoint.append({"type": "answer", "qid": qid, "model": model, "answer": text,
+                                        "batch_id": batch["batch_id"]})
+            else:
+                qid = record["custom_id"]
+                models = self.state.get("judged_models", {}).get(qid)
+                try:
+                    results = json.loads(text)["results"]
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    failed += 1
+                    continue
+                ranking, invalid = parse_ranking(results, models)
+                if invalid:
+                    print(f"[{qid}] ignored invalid judge entries: {invalid}", flush=True)
+                self.checkpoint.append({"type": "judge", "qid": qid, "models": models, "results": results,
+                                        "ranking": ranking, "batch_id": batch["batch_id"]})
+        batch["ingested"] = True
+        self.save_state()
+        print(f"Ingested {batch['stage']} batch {batch['batch_id']}: {len(records) - failed} ok, {failed} failed", flush=True)
+
+    # ---------------------------
+    # Whole run
+    # ---------------------------
+    def run(self, qids):
+        self.submit_competitors(qids)
+        self.wait("competitors")
+        self.submit_judging(qids)
+        self.wait("judge")
+        return leaderboard(self.checkpoint, qids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the LLM competition through batch APIs")
+    parser.add_argument("--questions", help="file with one question per line (.txt) or per JSON line (.jsonl)")
+    parser.add_argument("--generate", type=int, default=0, help="number of generated questions to add")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="local")
+    parser.add_argument("--checkpoint", default=CHECKPOINT)
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS, help="seconds between status checks")
+    parser.add_argument("--output", help="also write the leaderboard JSON to this file")
+    args = parser.parse_args()
+    if not args.questions and not args.generate:
+        parser.error("pass --questions and/or --generate")
+
+    load_dotenv(override=True)
+    checkpoint = Checkpoint(args.checkpoint)
+    questions = read_questions(args.questions) if args.questions else []
+    qids = asyncio.run(add_questions(checkpoint, questions, args.generate))
+
+    pipeline = BatchPipeline(BACKENDS[args.backend](), checkpoint, poll_seconds=args.poll)
+    board = pipeline.run(qids)
+    print_leaderboard(board)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(board, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
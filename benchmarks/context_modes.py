@@ -0,0 +1,108 @@
+# ======================================
+# Benchmark: full-context vs retrieval prompts
+# ======================================
+# Compares prompt size and latency between sending the whole profile with
+# every request and sending only the top-k retrieved chunks.
+#
+#   python -m benchmarks.context_modes            # local: tokens + build time
+#   python -m benchmarks.context_modes --live     # also time real gpt-4o-mini calls
+#
+# Prints a JSON report so runs can be compared.
+
+import argparse
+import json
+import statistics
+import time
+
+from profile_context import load_profile_context
+from prompts import PromptBuilder, context_section, count_tokens
+from retrieval import ProfileRetriever
+
+QUESTIONS = [
+    "What's your experience with Azure?",
+    "What certifications do you have?",
+    "Tell me about your time at AssetCues.",
+    "Which CI/CD tools have you used?",
+    "Do you write a blog?",
+    "What are you studying right now?",
+]
+
+INTRO = "You are acting as the profile owner, answering questions on their website. "
+CLOSING = "With this context, please chat with the user, always staying in character."
+
+
+def build_full(profile):
+    prompt = PromptBuilder(INTRO, context_section(profile.summary, profile.linkedin, profile.documents), CLOSING)
+    return lambda message: prompt.messages(message)
+
+
+def build_retrieval(profile, k):
+    prompt = PromptBuilder(INTRO, "\n\n", CLOSING)
+    retriever = ProfileRetriever(profile, k=k)
+    return lambda message: prompt.messages(message, extra=retriever.context_for(message))
+
+
+def prompt_tokens(messages):
+    return sum(count_tokens(m["content"]) for m in messages)
+
+
+def run_mode(name, build, live_client, repeat):
+    start = time.perf_counter()
+    make_messages = build()
+    setup_ms = (time.perf_counter() - start) * 1000
+
+    tokens, build_ms, call_ms = [], [], []
+    for _ in range(repeat):
+        for question in QUESTIONS:
+            start = time.perf_counter()
+            messages = make_messages(question)
+            build_ms.append((time.perf_counter() - start) * 1000)
+            tokens.append(prompt_tokens(messages))
+
+            if live_client:
+                start = time.perf_counter()
+                live_client.chat.completions.create(model="gpt-4o-mini", messages=messages, max_tokens=64)
+                call_ms.append((time.perf_counter() - start) * 1000)
+
+    report = {
+        "mode": name,
+        "setup_ms": round(setup_ms, 3),
+        "prompt_tokens_mean": round(statistics.mean(tokens), 1),
+        "prompt_build_ms_mean": round(statistics.mean(build_ms), 3),
+    }
+    if call_ms:
+        report["call_ms_p50"] = round(statistics.median(call_ms), 1)
+        report["call_ms_mean"] = round(statistics.mean(call_ms), 1)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--live", action="store_true", help="also time real gpt-4o-mini calls")
+    parser.add_argument("--top-k", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    live_client = None
+    if args.live:
+        from dotenv import load_dotenv
+        from openai import OpenAI
+
+        load_dotenv(override=True)
+        live_client = OpenAI()
+
+    profile = load_profile_context()
+    full = run_mode("full", lambda: build_full(profile), live_client, args.repeat)
+    retrieval = run_mode("retrieval", lambda: build_retrieval(profile, args.top_k), live_client, args.repeat)
+    full_tokens = full["prompt_tokens_mean"]
+    result = {
+        "questions": len(QUESTIONS),
+        "top_k": args.top_k,
+        "modes": [full, retrieval],
+        "token_reduction": round(1 - retrieval["prompt_tokens_mean"] / full_tokens, 3) if full_tokens else 0.0,
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
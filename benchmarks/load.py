@@ -0,0 +1,213 @@
+# ======================================
+# Offline load benchmark
+# ======================================
+# Starts the local API stub (benchmarks/stub_server.py), points every
+# provider at it and drives the real code paths under concurrent load:
+# - me          Me.achat_stream from MyChatBot.py (async clients, hedging, tool calls)
+# - evaluator   evaluator_agent.chat, including the reject -> rerun path
+#               (the evaluator gate is off by default so every reply reaches the
+#               stub's evaluator; --evaluator-gate on measures the gate instead)
+# - competition run_competition + judge from competition.py
+#
+# Reports p50/p95/p99 latency, throughput and time-to-first-token as JSON.
+#
+#   python -m benchmarks.load --requests 50 --concurrency 10 --output bench.json
+#   python -m benchmarks.load --scenario evaluator --reject-rate 0.5
+#   python -m benchmarks.load --scenario evaluator --evaluator-gate on
+#   python -m benchmarks.load --error-rate 0.2        # 429s, handled by rate_limits.py
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.stub_server import StubConfig, start_stub, stub_environment
+
+QUESTIONS = [
+    "What's your experience with Azure?",
+    "What certifications do you have?",
+    "Tell me about your time at AssetCues.",
+    "Which CI/CD tools have you used?",
+    "Have you filed any patent?",
+    "What are you studying right now?",
+]
+
+
+# ---------------------------
+# Measurement helpers
+# ---------------------------
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(name, samples, wall_time):
+    """
+    Turns (latency, ttft, error) samples into the JSON report for one scenario.
+    """
+    ok = [s for s in samples if s[2] is None]
+    errors = [s[2] for s in samples if s[2] is not None]
+    report = {"scenario": name, "requests": len(samples), "errors": len(errors),
+              "wall_time_s": round(wall_time, 3),
+              "throughput_rps": round(len(ok) / wall_time, 3) if wall_time else 0.0}
+    for label, values in (("latency_ms", [s[0] for s in ok]), ("ttft_ms", [s[1] for s in ok if s[1] is not None])):
+        if values:
+            report[label] = {
+                "p50": round(percentile(values, 50) * 1000, 1),
+                "p95": round(percentile(values, 95) * 1000, 1),
+                "p99": round(percentile(values, 99) * 1000, 1),
+                "mean": round(statistics.mean(values) * 1000, 1),
+            }
+    if errors:
+        report["first_error"] = errors[0]
+    return report
+
+
+def run_threaded(call, requests, concurrency):
+    """
+    Runs call(i) for i in range(requests) on `concurrency` threads.
+    """
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            ttft = call(i, start)
+            return time.perf_counter() - start, ttft, None
+        except Exception as e:
+            return time.perf_counter() - start, None, f"{type(e).__name__}: {e}"
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(timed, range(requests)))
+    return samples, time.perf_counter() - start
+
+
+def run_async(call, requests, concurrency):
+    """
+    Awaits call(i, start) for i in range(requests), `concurrency` at a time, on one event loop.
+    """
+    async def main():
+        limit = asyncio.Semaphore(concurrency)
+
+        async def timed(i):
+            async with limit:
+                start = time.perf_counter()
+                try:
+                    ttft = await call(i, start)
+                    return time.perf_counter() - start, ttft, None
+                except Exception as e:
+                    return time.perf_counter() - start, None, f"{type(e).__name__}: {e}"
+
+        start = time.perf_counter()
+        samples = await asyncio.gather(*(timed(i) for i in range(requests)))
+        return list(samples), time.perf_counter() - start
+
+    return asyncio.run(main())
+
+
+# ---------------------------
+# Scenarios
+# ---------------------------
+def bench_me(requests, concurrency):
+    from hedging import chat as hedged_chat
+    from MyChatBot import Me
+
+    me = Me()
+
+    async def call(i, start):
+        ttft = None
+        async for _ in me.achat_stream(QUESTIONS[i % len(QUESTIONS)], []):
+            if ttft is None:
+                ttft = time.perf_counter() - start
+        return ttft
+
+    report = summarize("me", *run_async(call, requests, concurrency))
+    report["hedging"] = dict(hedged_chat.stats)
+    return report
+
+
+def bench_evaluator(requests, concurrency):
+    import evaluator_agent
+
+    def call(i, start):
+        evaluator_agent.chat(QUESTIONS[i % len(QUESTIONS)], [])
+        return time.perf_counter() - start      # Not streamed: first token = whole reply
+
+    report = summarize("evaluator", *run_threaded(call, requests, concurrency))
+    gate = evaluator_agent.gate
+    report["evaluator_gate"] = {"enabled": gate.enabled, **gate.stats, "summary": gate.summary()}
+    return report
+
+
+def bench_competition(requests, concurrency):
+    from competition import run_competition, run_judge
+
+    async def call(i, start):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        _, answers = await run_competition(question)
+        ttft = time.perf_counter() - start      # All answers in, judging starts
+        json.loads(await run_judge(question, answers))
+        return ttft
+
+    return summarize("competition", *run_async(call, requests, concurrency))
+
+
+def scheduler_stats():
+    from rate_limits import scheduler
+
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in scheduler.stats.items()}
+
+
+SCENARIOS = {"me": bench_me, "evaluator": bench_evaluator, "competition": bench_competition}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load benchmark against a local API stub")
+    parser.add_argument("--scenario", choices=[*SCENARIOS, "all"], default="all")
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub seconds to first token")
+    parser.add_argument("--token-rate", type=float, default=100.0, help="stub tokens per second")
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--tool-call-rate", type=float, default=0.2)
+    parser.add_argument("--reject-rate", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="stub chance of answering 429")
+    parser.add_argument("--evaluator-gate", choices=["on", "off"], default="off",
+                        help="local evaluator gate (off: every reply goes to the stub evaluator)")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency, args.token_rate, args.reply_tokens, args.tool_call_rate, args.reject_rate,
+                        error_rate=args.error_rate, seed=0)
+    server, base_url = start_stub(config)
+
+    # Point everything at the stub before any script module is imported.
+    # (A local .env may still override the keys, but not the *_BASE_URLs.)
+    # Response caching is off so every request exercises the model path, and
+    # the gate is off by default because it skips every stub reply, which
+    # would leave --reject-rate without effect.
+    os.environ.update(stub_environment(base_url))
+    os.environ["RESPONSE_CACHE"] = "0"
+    os.environ["EVALUATOR_GATE"] = args.evaluator_gate
+
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    report = {
+        "config": vars(args),
+        "results": [SCENARIOS[name](args.requests, args.concurrency) for name in names],
+        "stub_requests": server.RequestHandlerClass.stats["requests"],
+        "rate_limits": scheduler_stats(),
+    }
+    server.shutdown()
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# ======================================
+# Benchmark: CLI startup time per command
+# ======================================
+# Imports each main.py command's module in a fresh interpreter (nothing is
+# launched and no API is called) and compares the median import time with
+# main.STARTUP_BUDGETS. Also lists which heavy packages each command pulled
+# in, so a stray top-level import shows up straight away.
+#
+#   python -m benchmarks.startup                  # every command, 3 runs each
+#   python -m benchmarks.startup --command chat --repeat 5
+#
+# Prints a JSON report and exits with 1 if any command is over budget.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from benchmarks.stub_server import stub_environment
+from main import COMMANDS, STARTUP_BUDGETS
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY = ("gradio", "anthropic", "pypdf", "IPython", "agents", "openai", "fastapi")
+
+# Runs in the child: time `import main` + the command's import, then report
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+if {name!r} != "main":
+    main.load({name!r})
+seconds = time.perf_counter() - start
+heavy = sorted(m for m in {heavy!r} if m in sys.modules)
+print(json.dumps({{"seconds": seconds, "heavy": heavy}}))
+"""
+
+
+def probe(name):
+    """
+    One cold import of a command in a new interpreter: {"seconds", "heavy"} or {"error"}.
+    """
+    env = {**os.environ, **stub_environment("http://127.0.0.1:9"), "TRACE_FILE": ""}
+    done = subprocess.run([sys.executable, "-c", PROBE.format(name=name, heavy=HEAVY)],
+                          cwd=ROOT, env=env, capture_output=True, text=True)
+    if done.returncode != 0:
+        return {"error": (done.stderr.strip().splitlines() or ["exit code %d" % done.returncode])[-1]}
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+
+def measure(name, repeat):
+    runs = [probe(name) for _ in range(repeat)]
+    errors = [r["error"] for r in runs if "error" in r]
+    budget = STARTUP_BUDGETS.get(name)
+    if errors:
+        return {"command": name, "budget_s": budget, "status": "error", "error": errors[-1]}
+    seconds = statistics.median(r["seconds"] for r in runs)
+    return {
+        "command": name,
+        "import_s": round(seconds, 3),
+        "budget_s": budget,
+        "status": "ok" if budget is None or seconds <= budget else "over budget",
+        "heavy_imports": runs[-1]["heavy"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time of every main.py command")
+    parser.add_argument("--command", choices=["main", *COMMANDS], action="append",
+                        help="command to measure (repeatable; default: all, plus main.py itself)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    names = args.command or ["main", *COMMANDS]
+    report = {"python": sys.version.split()[0], "repeat": args.repeat,
+              "results": [measure(name, args.repeat) for name in names]}
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    if any(r["status"] == "over budget" for r in report["results"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# ======================================
+# Local stub for the OpenAI and Anthropic APIs
+# ======================================
+# Speaks just enough of the real APIs for the scripts in this repo to run
+# offline, with no API keys:
+# - POST .../chat/completions  (OpenAI and every OpenAI-compatible provider)
+#     streaming and non-streaming, n > 1, tool_calls, and json_schema
+#     response formats (what `beta.chat.completions.parse` sends)
+# - POST /v1/messages          (Anthropic)
+# - POST /1/messages.json      (Pushover, so notifications go nowhere)
+#
+# Latency, token rate, tool-call rate and the evaluator's rejection rate are
+# configurable, so benchmarks can model slow or flaky providers.
+#
+#   python -m benchmarks.stub_server --port 8765 --latency 0.3 --token-rate 80
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("cloud devops azure jenkins pipeline experience project team build deploy "
+         "monitor scale automate infrastructure learning blog").split()
+
+
+@dataclass
+class StubConfig:
+    latency: float = 0.2            # Seconds before the first token
+    token_rate: float = 100.0       # Tokens per second after the first one
+    reply_tokens: int = 60          # Tokens per generated reply
+    tool_call_rate: float = 0.0     # Chance of answering with a tool call when tools are offered
+    reject_rate: float = 0.0        # Chance a json_schema "is_acceptable" field is False
+    error_rate: float = 0.0         # Chance of answering 429 (with retry-after)
+    seed: int = None
+
+
+# ---------------------------
+# Fake content
+# ---------------------------
+def fake_words(count, rng):
+    return [rng.choice(WORDS) for _ in range(count)]
+
+
+def fake_from_schema(schema, rng, config, defs=None):
+    """
+    Builds a value matching a JSON schema (enough for pydantic models).
+    """
+    defs = defs or schema.get("$defs", {})
+    if "$ref" in schema:
+        return fake_from_schema(defs[schema["$ref"].split("/")[-1]], rng, config, defs)
+    kind = schema.get("type")
+    if kind == "object":
+        return {
+            key: (rng.random() >= config.reject_rate if key == "is_acceptable"
+                  else fake_from_schema(value, rng, config, defs))
+            for key, value in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        return [fake_from_schema(schema.get("items", {}), rng, config, defs)]
+    if kind == "boolean":
+        return True
+    if kind == "integer":
+        return 1
+    if kind == "number":
+        return 1.0
+    return " ".join(fake_words(8, rng))
+
+
+def judge_reply(prompt):
+    """
+    A valid ranking for the orchestrator's judge prompt.
+    """
+    match = re.search(r"between (\d+) competitors", prompt)
+    count = int(match.group(1)) if match else 1
+    ranking = [str(i) for i in range(1, count + 1)]
+    random.shuffle(ranking)
+    return json.dumps({"results": ranking})
+
+
+def last_text(messages):
+    for message in reversed(messages):
+        content = message.get("content")
+        if isinstance(content, str):
+            return content
+    return ""
+
+
+# ---------------------------
+# Request handler
+# ---------------------------
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"          # Keep-alive, like the real APIs
+    config = StubConfig()
+    rng = random.Random()
+    stats = {"requests": 0}
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        self.stats["requests"] += 1
+
+        if self.path.endswith("/1/messages.json"):
+            return self.send_json({"status": 1})
+        request = json.loads(body or b"{}")
+
+        if self.config.error_rate and self.rng.random() < self.config.error_rate:
+            return self.send_json({"error": {"message": "rate limited", "type": "rate_limit"}}, 429,
+                                  {"retry-after": "0.1"})
+        if self.path.endswith("/chat/completions"):
+            return self.chat_completions(request)
+        if self.path.endswith("/v1/messages"):
+            return self.anthropic_messages(request)
+        self.send_json({"error": {"message": f"unknown path {self.path}"}}, 404)
+
+    # --- OpenAI chat.completions ---
+    def choice_content(self, request):
+        """
+        Returns (content, tool_calls) for one choice.
+        """
+        messages = request.get("messages", [])
+        tools = request.get("tools") or []
+        if tools and messages and messages[-1].get("role") != "tool" and self.rng.random() < self.config.tool_call_rate:
+            function = self.rng.choice(tools)["function"]
+            arguments = fake_from_schema(function["parameters"], self.rng, self.config)
+            return None, [{"id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                           "function": {"name": function["name"], "arguments": json.dumps(arguments)}}]
+
+        response_format = request.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            schema = response_format["json_schema"]["schema"]
+            return json.dumps(fake_from_schema(schema, self.rng, self.config)), None
+        if '{"results"' in last_text(messages):
+            return judge_reply(last_text(messages)), None
+        return " ".join(fake_words(self.config.reply_tokens, self.rng)), None
+
+    def chat_completions(self, request):
+        n = request.get("n") or 1
+        choices = [self.choice_content(request) for _ in range(n)]
+        prompt_tokens = sum(len(str(m.get("content") or "").split()) for m in request.get("messages", []))
+        completion_tokens = sum(len((c or "").split()) for c, _ in choices)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens,
+                 "prompt_tokens_details": {"cached_tokens": 0}}
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": request.get("model")}
+
+        time.sleep(self.config.latency)
+        if request.get("stream"):
+            try:
+                return self.stream_chat(base, choices, usage, request.get("stream_options") or {})
+            except (BrokenPipeError, ConnectionResetError):
+                return             # Client closed the stream early (hedge loser, aborted reply)
+
+        time.sleep(completion_tokens / n / self.config.token_rate)
+        self.send_json({**base, "object": "chat.completion", "usage": usage, "choices": [
+            {"index": i, "finish_reason": "tool_calls" if calls else "stop",
+             "message": {"role": "assistant", "content": content, "tool_calls": calls, "refusal": None}}
+            for i, (content, calls) in enumerate(choices)
+        ]})
+
+    def stream_chat(self, base, choices, usage, stream_options):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(data):
+            payload = f"data: {data}\n\n".encode()
+            self.wfile.write(f"{len(payload):x}\r\n".encode() + payload + b"\r\n")
+            self.wfile.flush()
+
+        def chunk(index, delta, finish_reason=None):
+            event(json.dumps({**base, "object": "chat.completion.chunk", "choices": [
+                {"index": index, "delta": delta, "finish_reason": finish_reason}]}))
+
+        for index, (content, calls) in enumerate(choices):
+            chunk(index, {"role": "assistant", "content": ""})
+            if calls:
+                for position, call in enumerate(calls):
+                    arguments = call["function"]["arguments"]
+                    chunk(index, {"tool_calls": [{"index": position, "id": call["id"], "type": "function",
+                                                  "function": {"name": call["function"]["name"], "arguments": ""}}]})
+                    for start in range(0, len(arguments), 8):
+                        chunk(index, {"tool_calls": [{"index": position, "function": {"arguments": arguments[start:start + 8]}}]})
+                chunk(index, {}, "tool_calls")
+            else:
+                words = content.split(" ")
+                for position, word in enumerate(words):
+                    chunk(index, {"content": word if position == 0 else " " + word})
+                    time.sleep(1 / self.config.token_rate)
+                chunk(index, {}, "stop")
+
+        if stream_options.get("include_usage"):
+            event(json.dumps({**base, "object": "chat.completion.chunk", "choices": [], "usage": usage}))
+        event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    # --- Anthropic messages ---
+    def anthropic_messages(self, request):
+        tokens = min(self.config.reply_tokens, request.get("max_tokens") or self.config.reply_tokens)
+        time.sleep(self.config.latency + tokens / self.config.token_rate)
+        text = " ".join(fake_words(tokens, self.rng))
+        self.send_json({
+            "id": f"msg_{uuid.uuid4().hex[:12]}", "type": "message", "role": "assistant",
+            "model": request.get("model"), "stop_reason": "end_turn", "stop_sequence": None,
+            "content": [{"type": "text", "text": text}],
+            "usage": {"input_tokens": sum(len(str(m.get("content")).split()) for m in request.get("messages", [])),
+                      "output_tokens": tokens},
+        })
+
+    def send_json(self, payload, status=200, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+# ---------------------------
+# Running the stub
+# ---------------------------
+def start_stub(config=None, host="127.0.0.1", port=0):
+    """
+    Starts the stub on a background thread. Returns (server, base_url).
+    """
+    handler = type("ConfiguredStubHandler", (StubHandler,), {
+        "config": config or StubConfig(),
+        "rng": random.Random((config or StubConfig()).seed),
+        "stats": {"requests": 0},
+    })
+    server_class = type("StubServer", (ThreadingHTTPServer,), {"request_queue_size": 1024})   # Hundreds of sessions
+    server = server_class((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-server", daemon=True).start()
+    return server, f"http://{host}:{server.server_port}"
+
+
+def stub_environment(base_url):
+    """
+    Environment variables that point every provider (and Pushover) at the stub.
+    """
+    return {
+        "OPENAI_BASE_URL": f"{base_url}/v1",
+        "ANTHROPIC_BASE_URL": base_url,
+        "GEMINI_BASE_URL": f"{base_url}/v1beta/openai/",
+        "DEEPSEEK_BASE_URL": f"{base_url}/v1",
+        "GROQ_BASE_URL": f"{base_url}/openai/v1",
+        "PUSHOVER_URL": f"{base_url}/1/messages.json",
+        "OPENAI_API_KEY": "stub", "ANTHROPIC_API_KEY": "stub", "GOOGLE_API_KEY": "stub",
+        "DEEPSEEK_API_KEY": "stub", "GROQ_API_KEY": "stub",
+        "PUSHOVER_TOKEN": "stub", "PUSHOVER_USER": "stub",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenAI/Anthropic API stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--token-rate", type=float, default=100.0)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--tool-call-rate", type=float, default=0.0)
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency, args.token_rate, args.reply_tokens,
+                        args.tool_call_rate, args.reject_rate, args.error_rate)
+    server, base_url = start_stub(config, args.host, args.port)
+    print(f"Stub listening on {base_url}")
+    for key, value in stub_environment(base_url).items():
+        print(f"export {key}={value}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
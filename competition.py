@@ -0,0 +1,181 @@
+# ======================================
+# Async LLM competition runner
+# ======================================
+# Sends the same question to every competitor at once instead of one after
+# another, so the wall time is roughly the slowest single call rather than
+# the sum of all of them.
+
+# --- Imports ---
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+
+from providers import async_client
+from rate_limits import BATCH, scheduler
+from tracing import record_usage, span
+
+
+# --- Competitor definitions ---
+@dataclass(frozen=True)
+class Competitor:
+    model: str       # Model name sent to the provider
+    provider: str    # Key into providers.PROVIDERS
+
+
+# The order here is the order the judge sees (competitor 1, 2, 3, ...)
+COMPETITORS = [
+    Competitor("gpt-4o-mini", "openai"),
+    Competitor("claude-3-7-sonnet-latest", "anthropic"),
+    Competitor("gemini-2.0-flash", "gemini"),
+    Competitor("deepseek-chat", "deepseek"),
+    Competitor("llama-3.3-70b-versatile", "groq"),
+]
+
+# How many requests may be in flight per provider at the same time
+PROVIDER_CONCURRENCY = {"openai": 4, "anthropic": 2, "gemini": 4, "deepseek": 2, "groq": 2}
+DEFAULT_CONCURRENCY = 2
+
+# Seconds to wait for a single competitor before giving up on it
+DEFAULT_TIMEOUT = float(os.getenv("COMPETITION_TIMEOUT", "120"))
+
+# Model that ranks the answers
+JUDGE_MODEL = "o3-mini"
+
+# Model and prompt used to come up with test questions
+QUESTION_MODEL = "gpt-4o-mini"
+QUESTION_REQUEST = "Please come up with a challenging, nuanced question that I can ask a number of LLMs to evaluate their intelligence. Answer only with the question, no explanation."
+
+
+# --- Asking one competitor ---
+async def ask(client, competitor, messages):
+    """
+    Sends the messages to one competitor and returns the answer text.
+    """
+    if competitor.provider == "anthropic":
+        response = await scheduler.acall(competitor.provider, client.messages.create, priority=BATCH,
+                                         model=competitor.model, messages=messages, max_tokens=1000)
+        record_usage(response.usage)
+        return response.content[0].text
+    response = await scheduler.acall(competitor.provider, client.chat.completions.create, priority=BATCH,
+                                     model=competitor.model, messages=messages)
+    record_usage(response.usage)
+    return response.choices[0].message.content
+
+
+# --- Competition ---
+def provider_semaphores(competitors, concurrency=None):
+    """
+    One semaphore per provider, limiting how many requests it gets at once.
+    """
+    concurrency = {**PROVIDER_CONCURRENCY, **(concurrency or {})}
+    semaphores = {}
+    for competitor in competitors:
+        if competitor.provider not in semaphores:
+            semaphores[competitor.provider] = asyncio.Semaphore(
+                concurrency.get(competitor.provider, DEFAULT_CONCURRENCY)
+            )
+    return semaphores
+
+
+async def run_competition(question, competitors=COMPETITORS, timeout=DEFAULT_TIMEOUT, concurrency=None):
+    """
+    Asks every competitor the question concurrently.
+
+    Returns (competitor names, answers) in the same order as `competitors`,
+    so the judge's 1-based indices still line up. Competitors that fail or
+    time out are left out of both lists.
+    """
+    messages = [{"role": "user", "content": question}]
+    semaphores = provider_semaphores(competitors, concurrency)
+
+    async def ask_one(competitor):
+        queued = time.perf_counter()
+        async with semaphores[competitor.provider]:
+            with span("competitor", kind="model", provider=competitor.provider, model=competitor.model,
+                      queued_since=queued):
+                start = time.perf_counter()
+                client = async_client(competitor.provider)    # Shared, pooled client
+                answer = await asyncio.wait_for(ask(client, competitor, messages), timeout)
+                print(f"{competitor.model} answered in {time.perf_counter() - start:.1f}s", flush=True)
+                return answer
+
+    results = await asyncio.gather(*(ask_one(c) for c in competitors), return_exceptions=True)
+
+    names, answers = [], []
+    for competitor, result in zip(competitors, results):
+        if isinstance(result, BaseException):
+            print(f"{competitor.model} failed: {type(result).__name__}: {result}", flush=True)
+            continue
+        names.append(competitor.model)
+        answers.append(result)
+    return names, answers
+
+
+# --- Questions ---
+async def generate_question(model=QUESTION_MODEL):
+    """
+    Asks a model for a fresh test question.
+    """
+    messages = [{"role": "user", "content": QUESTION_REQUEST}]
+    with span("question", kind="model", provider="openai", model=model) as s:
+        response = await scheduler.acall("openai", async_client("openai").chat.completions.create,
+                                         priority=BATCH, model=model, messages=messages)
+        s.record_usage(response.usage)
+    return response.choices[0].message.content.strip()
+
+
+# --- Judging ---
+def judge_prompt(question, answers):
+    """
+    Builds the judge prompt; competitors are numbered from 1 in `answers` order.
+    """
+    together = ""
+    for index, answer in enumerate(answers):
+        together += f"# Response from competitor {index+1}\n\n"
+        together += answer + "\n\n"
+
+    return f"""You are judging a competition between {len(answers)} competitors.
+Each model has been given this question:
+
+{question}
+
+Your job is to evaluate each response for clarity and strength of argument, and rank them in order of best to worst.
+Respond with JSON, and only JSON, with the following format:
+{{"results": ["best competitor number", "second best competitor number", "third best competitor number", ...]}}
+
+Here are the responses from each competitor:
+
+{together}
+
+Now respond with the JSON with the ranked order of the competitors, nothing else. Do not include markdown formatting or code blocks."""
+
+
+def parse_ranking(results, models):
+    """
+    Maps the judge's competitor numbers to models: (ranking, invalid entries).
+    """
+    ranking, invalid = [], []
+    for r in results:
+        try:
+            number = int(r)
+        except (TypeError, ValueError):
+            invalid.append(r)
+            continue
+        if 0 < number <= len(models) and models[number - 1] not in ranking:
+            ranking.append(models[number - 1])
+        else:
+            invalid.append(r)
+    return ranking, invalid
+
+
+async def run_judge(question, answers, model=JUDGE_MODEL):
+    """
+    Asks the judge to rank the answers. Returns the raw JSON text.
+    """
+    messages = [{"role": "user", "content": judge_prompt(question, answers)}]
+    with span("judge", kind="judge", provider="openai", model=model) as s:
+        response = await scheduler.acall("openai", async_client("openai").chat.completions.create,
+                                         priority=BATCH, model=model, messages=messages)
+        s.record_usage(response.usage)
+    return response.choices[0].message.content
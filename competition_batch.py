@@ -0,0 +1,261 @@
+# ======================================
+# Resumable multi-question competition
+# ======================================
+# Runs the competition over a whole question set instead of one question:
+# every question x competitor cell is asked with bounded concurrency, and
+# every answer and judge ranking is appended to a JSONL checkpoint as soon
+# as it arrives. Rerunning with the same checkpoint skips completed cells,
+# so a crash or Ctrl-C only loses the calls that were in flight.
+#
+# At the end the judge's `results` rankings are aggregated into per-model
+# win rates and mean rank across the set.
+#
+#   python competition_batch.py --questions questions.txt
+#   python competition_batch.py --generate 20 --checkpoint .cache/competition.jsonl
+#
+# Checkpoint records (one JSON object per line, later lines win):
+#   {"type": "question", "qid": ..., "question": ..., "source": "file" | "generated"}
+#   {"type": "answer", "qid": ..., "model": ..., "answer": ..., "seconds": ...}
+#   {"type": "judge", "qid": ..., "models": [...], "results": [...], "ranking": [...]}
+# Failed calls are not recorded, so they are retried on the next run.
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from competition import (COMPETITORS, DEFAULT_TIMEOUT, JUDGE_MODEL, ask, generate_question,
+                         parse_ranking, provider_semaphores, run_judge)
+from providers import async_client
+from tracing import span
+
+CHECKPOINT = os.getenv("COMPETITION_CHECKPOINT", ".cache/competition.jsonl")
+BATCH_CONCURRENCY = 8        # Question x competitor cells in flight at once
+
+
+def question_id(question):
+    return hashlib.sha256(question.strip().encode("utf-8")).hexdigest()[:12]
+
+
+def read_questions(path):
+    """
+    One question per line (.txt) or {"question": ...} per line (.jsonl).
+    """
+    questions = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        questions.append(json.loads(line)["question"] if path.endswith(".jsonl") else line)
+    return questions
+
+
+# ---------------------------
+# Checkpoint
+# ---------------------------
+class Checkpoint:
+    """
+    Append-only JSONL log of questions, answers and judge rankings.
+    """
+
+    def __init__(self, path=CHECKPOINT):
+        self.path = Path(path)
+        self.questions = {}                   # qid -> record
+        self.answers = defaultdict(dict)      # qid -> {model: record}
+        self.judgements = {}                  # qid -> latest judge record
+        if self.path.exists():
+            self.load()
+
+    def load(self):
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue                  # Torn last line from a crash
+                self.apply(record)
+
+    def apply(self, record):
+        kind, qid = record.get("type"), record.get("qid")
+        if kind == "question":
+            self.questions.setdefault(qid, record)
+        elif kind == "answer":
+            self.answers[qid][record["model"]] = record
+        elif kind == "judge":
+            self.judgements[qid] = record
+
+    def append(self, record):
+        self.apply(record)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def add_question(self, question, source):
+        qid = question_id(question)
+        if qid not in self.questions:
+            self.append({"type": "question", "qid": qid, "question": question, "source": source})
+        return qid
+
+    def judged(self, qid, models):
+        judgement = self.judgements.get(qid)
+        return judgement is not None and judgement["models"] == models
+
+
+# ---------------------------
+# Running the cells
+# ---------------------------
+async def ask_cell(checkpoint, qid, competitor, semaphores, limit, timeout):
+    """
+    Asks one competitor one question and checkpoints the answer.
+    """
+    question = checkpoint.questions[qid]["question"]
+    messages = [{"role": "user", "content": question}]
+    queued = time.perf_counter()
+    async with semaphores[competitor.provider], limit:     # Only hold a batch slot once the provider has room
+        with span("competitor", kind="model", provider=competitor.provider, model=competitor.model,
+                  queued_since=queued, qid=qid):
+            start = time.perf_counter()
+            client = async_client(competitor.provider)
+            answer = await asyncio.wait_for(ask(client, competitor, messages), timeout)
+    checkpoint.append({"type": "answer", "qid": qid, "model": competitor.model,
+                       "answer": answer, "seconds": round(time.perf_counter() - start, 3)})
+    print(f"[{qid}] {competitor.model} answered", flush=True)
+
+
+async def judge_question(checkpoint, qid, competitors, limit, judge_model):
+    """
+    Ranks whatever answers the question has (in COMPETITORS order) and
+    checkpoints the ranking. Skipped if the same answers were already judged.
+    """
+    answered = checkpoint.answers.get(qid, {})
+    models = [c.model for c in competitors if c.model in answered]
+    if len(models) < 2 or checkpoint.judged(qid, models):
+        return
+    question = checkpoint.questions[qid]["question"]
+    async with limit:
+        raw = await run_judge(question, [answered[m]["answer"] for m in models], judge_model)
+    results = json.loads(raw)["results"]
+    ranking, invalid = parse_ranking(results, models)
+    if invalid:
+        print(f"[{qid}] ignored invalid judge entries: {invalid}", flush=True)
+    checkpoint.append({"type": "judge", "qid": qid, "models": models, "results": results, "ranking": ranking})
+    print(f"[{qid}] judged: {' > '.join(ranking)}", flush=True)
+
+
+async def run_question(checkpoint, qid, competitors, semaphores, limit, timeout, judge_model):
+    done = checkpoint.answers.get(qid, {})
+    pending = [c for c in competitors if c.model not in done]
+    results = await asyncio.gather(
+        *(ask_cell(checkpoint, qid, c, semaphores, limit, timeout) for c in pending),
+        return_exceptions=True,
+    )
+    for competitor, result in zip(pending, results):
+        if isinstance(result, BaseException):
+            print(f"[{qid}] {competitor.model} failed: {type(result).__name__}: {result}", flush=True)
+    try:
+        await judge_question(checkpoint, qid, competitors, limit, judge_model)
+    except Exception as e:
+        print(f"[{qid}] judge failed: {type(e).__name__}: {e}", flush=True)
+
+
+async def add_questions(checkpoint, questions=(), generate=0):
+    """
+    Adds the given questions plus `generate` generated ones to the checkpoint
+    and returns their ids. Generated questions are checkpointed too, so a
+    restart reuses them instead of making new ones.
+    """
+    qids = [checkpoint.add_question(q, "file") for q in questions]
+    generated = [qid for qid, r in checkpoint.questions.items() if r.get("source") == "generated"]
+    if generate > len(generated):
+        new = await asyncio.gather(*(generate_question() for _ in range(generate - len(generated))))
+        generated += [checkpoint.add_question(q, "generated") for q in new]
+    qids += generated[:generate]
+    return list(dict.fromkeys(qids))
+
+
+async def run_batch(questions=(), generate=0, checkpoint=None, competitors=COMPETITORS,
+                    concurrency=BATCH_CONCURRENCY, timeout=DEFAULT_TIMEOUT, judge_model=JUDGE_MODEL):
+    """
+    Runs every question x competitor cell that is not in the checkpoint yet,
+    judges each question, and returns the aggregated leaderboard.
+    """
+    checkpoint = checkpoint or Checkpoint()
+    qids = await add_questions(checkpoint, questions, generate)
+
+    limit = asyncio.Semaphore(concurrency)
+    semaphores = provider_semaphores(competitors)
+    with span("competition.batch", kind="competition", questions=len(qids)):
+        await asyncio.gather(*(
+            run_question(checkpoint, qid, competitors, semaphores, limit, timeout, judge_model)
+            for qid in qids
+        ))
+    return leaderboard(checkpoint, qids)
+
+
+# ---------------------------
+# Aggregation
+# ---------------------------
+def leaderboard(checkpoint, qids=None):
+    """
+    Per-model win rate and mean rank over the judged questions.
+    """
+    stats = defaultdict(lambda: {"judged": 0, "wins": 0, "rank_sum": 0})
+    qids = qids if qids is not None else list(checkpoint.judgements)
+    judged = 0
+    for qid in qids:
+        judgement = checkpoint.judgements.get(qid)
+        if not judgement:
+            continue
+        judged += 1
+        for rank, model in enumerate(judgement["ranking"], start=1):
+            s = stats[model]
+            s["judged"] += 1
+            s["wins"] += rank == 1
+            s["rank_sum"] += rank
+
+    rows = [{"model": model, "judged": s["judged"],
+             "win_rate": round(s["wins"] / s["judged"], 3),
+             "mean_rank": round(s["rank_sum"] / s["judged"], 2)}
+            for model, s in stats.items()]
+    rows.sort(key=lambda row: (row["mean_rank"], -row["win_rate"]))
+    return {"questions": len(qids), "judged": judged, "models": rows}
+
+
+def print_leaderboard(board):
+    print(f"\n--- Leaderboard ({board['judged']} of {board['questions']} questions judged) ---")
+    for row in board["models"]:
+        print(f"{row['model']:<28} win rate {row['win_rate']:>6.1%}   mean rank {row['mean_rank']:.2f}   ({row['judged']} judged)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the LLM competition over a question set")
+    parser.add_argument("--questions", help="file with one question per line (.txt) or per JSON line (.jsonl)")
+    parser.add_argument("--generate", type=int, default=0, help="number of generated questions to include")
+    parser.add_argument("--checkpoint", default=CHECKPOINT)
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT)
+    parser.add_argument("--output", help="also write the leaderboard JSON to this file")
+    args = parser.parse_args(argv)
+    if not args.questions and not args.generate:
+        parser.error("pass --questions and/or --generate")
+
+    load_dotenv(override=True)
+    questions = read_questions(args.questions) if args.questions else []
+    board = asyncio.run(run_batch(questions, args.generate, Checkpoint(args.checkpoint),
+                                  concurrency=args.concurrency, timeout=args.timeout))
+    print_leaderboard(board)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(board, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,24 @@
 # ======================================
 
 # Install required packages before running:
-# pip install python-dotenv openai pypdf gradio pydantic
+# pip install python-dotenv openai pypdf gradio pydantic numpy
 
 from dotenv import load_dotenv
-from openai import OpenAI
-from pypdf import PdfReader
+from providers import client
+from profile_context import load_profile_context
 import gradio as gr
 from pydantic import BaseModel
+from prompts import PromptBuilder, context_section, count_tokens, report_usage
+from history import HistoryManager, llm_summarizer
+from retrieval import CONTEXT_MODE, ProfileRetriever, join_extra
+from response_cache import ResponseCache
+from sessions import SessionStore, session_id_of
+from evaluator_gate import EvaluatorGate
+from rate_limits import INTERACTIVE, scheduler
+from hedging import chat as hedged_chat
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from tracing import span, start_metrics_server, traced
+import contextvars
 import os
 
 # ---------------------------
@@ -21,39 +32,71 @@ import os
 
 load_dotenv(override=True)
 
-openai = OpenAI()  # OpenAI client (uses OPENAI_API_KEY)
+openai = client("openai")  # OpenAI client (uses OPENAI_API_KEY)
 
-gemini = OpenAI(   # Gemini client (uses GOOGLE_API_KEY)
-    api_key=os.getenv("GOOGLE_API_KEY"),
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-)
+gemini = client("gemini")  # Gemini client (uses GOOGLE_API_KEY, OpenAI-compatible endpoint)
+
+# Speculative mode: generate this many candidates in one request and evaluate
+# them all at once. 1 keeps the plain generate -> evaluate -> rerun flow.
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", "1"))
+
+# Streaming evaluation: check the reply while it is generated and cut it off
+# (and start the rerun) as soon as it breaks a rule. 0 evaluates finished replies only.
+STREAMING_EVALUATION = os.getenv("EVALUATOR_STREAMING", "1") == "1"
+
+# Worker threads for running evaluations side by side
+executor = ThreadPoolExecutor(max_workers=max(4, SPECULATIVE_CANDIDATES))
 
 # ---------------------------
 # Step 2: Read profile data
 # ---------------------------
-reader = PdfReader("linkedin.pdf")
-linkedin = ""
-for page in reader.pages:
-    text = page.extract_text()
-    if text:
-        linkedin += text
+# Extracted text is cached on disk and shared with MyChatBot (see profile_context.py)
+profile = load_profile_context()
+linkedin = profile.linkedin
+summary = profile.summary
+documents = profile.documents   # Extra documents from PROFILE_DOCS_DIR (see profile_context.py)
+
+# Long sessions: recent turns verbatim, older ones folded into a rolling summary
+history_manager = HistoryManager(llm_summarizer(openai))
 
-with open("summary.txt", "r", encoding="utf-8") as f:
-    summary = f.read()
+# Evaluated replies to repeated questions are cached (dropped when the profile changes)
+cache = ResponseCache("evaluator", profile.content_hash)
+
+# Conversations are kept server-side per Gradio session (see sessions.py)
+sessions = SessionStore("evaluator")
 
 # ---------------------------
 # Step 3: System prompt (persona setup)
 # ---------------------------
 name = "Nidhish"
 
-system_prompt = f"You are acting as {name}. You are answering questions on {name}'s website, \
+persona_intro = f"You are acting as {name}. You are answering questions on {name}'s website, \
 particularly questions related to {name}'s career, background, skills and experience. \
 Your responsibility is to represent {name} for interactions on the website as faithfully as possible. \
 Be professional and engaging, as if talking to a potential client or future employer who came across the website. \
 If you don't know the answer, say so."
 
-system_prompt += f"\n\n## Summary:\n{summary}\n\n## LinkedIn Profile:\n{linkedin}\n\n"
-system_prompt += f"With this context, please chat with the user, always staying in character as {name}."
+# In retrieval mode the profile is left out of the prefixes and the relevant
+# chunks are sent per request instead (see retrieval.py)
+retriever = ProfileRetriever(profile) if CONTEXT_MODE == "retrieval" else None
+profile_section = "\n\n" if retriever else context_section(summary, linkedin, documents)
+
+def relevant_context(query, history):
+    return retriever.context_for(query, history) if retriever else None
+
+persona_closing = f"With this context, please chat with the user, always staying in character as {name}."
+
+# Built once and never modified, so the provider can cache it across requests.
+# Per-request instructions are passed as `extra` and land after the history.
+persona = PromptBuilder(persona_intro, profile_section, persona_closing)
+system_prompt = persona.prefix
+
+PIG_LATIN_RULE = "Everything in your reply must be in pig latin."
+
+def fit_history(message, history, extra=None):
+    # Compacted history that fits the per-request token budget
+    reserved = persona.prefix_tokens + count_tokens(message) + (count_tokens(extra) if extra else 0)
+    return history_manager.fit(history, reserved)
 
 # ---------------------------
 # Step 4: Evaluation schema
@@ -65,63 +108,111 @@ class Evaluation(BaseModel):
 # ---------------------------
 # Step 5: Evaluator setup
 # ---------------------------
-evaluator_system_prompt = f"You are an evaluator that decides whether a response to a question is acceptable. \
+evaluator_intro = f"You are an evaluator that decides whether a response to a question is acceptable. \
 The Agent is playing the role of {name}, who must be professional and engaging. \
 Here is {name}'s context:"
 
-evaluator_system_prompt += f"\n\n## Summary:\n{summary}\n\n## LinkedIn Profile:\n{linkedin}\n\n"
+evaluator = PromptBuilder(evaluator_intro, profile_section)
+evaluator_system_prompt = evaluator.prefix
 
-def evaluator_user_prompt(reply, message, history):
-    user_prompt = f"Here's the conversation between the User and the Agent: \n\n{history}\n\n"
+print(f"Prompt prefixes: persona={persona.prefix_tokens} tokens, evaluator={evaluator.prefix_tokens} tokens")
+
+def evaluator_user_prompt(reply, message, history, partial=False):
+    reserved = evaluator.prefix_tokens + count_tokens(message) + count_tokens(reply)
+    conversation = history_manager.as_text(history, reserved)
+    user_prompt = f"Here's the conversation between the User and the Agent: \n\n{conversation}\n\n"
     user_prompt += f"Here's the latest message from the User: \n\n{message}\n\n"
+    if partial:
+        # A checkpoint while the reply is still streaming
+        user_prompt += f"Here's the beginning of the Agent's response, which is still being written: \n\n{reply}\n\n"
+        user_prompt += "Please evaluate only what has been written so far: do not reject it for being incomplete, "
+        user_prompt += "only for content that is already unacceptable. Reply with whether it is acceptable and your feedback."
+        return user_prompt
     user_prompt += f"Here's the latest response from the Agent: \n\n{reply}\n\n"
     user_prompt += "Please evaluate the response, replying with whether it is acceptable and your feedback."
     return user_prompt
 
-def evaluate(reply, message, history) -> Evaluation:
-    messages = [{"role": "system", "content": evaluator_system_prompt}] + \
-            [{"role": "user", "content": evaluator_user_prompt(reply, message, history)}]
+def evaluate(reply, message, history, priority=INTERACTIVE, partial=False) -> Evaluation:
+    context = relevant_context(f"{message} {reply}", history)
+    messages = evaluator.messages(evaluator_user_prompt(reply, message, history, partial), extra=context)
 
-    response = gemini.beta.chat.completions.parse(
-        model="gemini-2.0-flash",
-        messages=messages,
-        response_format=Evaluation
-    )
+    with span("evaluate", kind="evaluate", provider="gemini", model="gemini-2.0-flash", partial=partial) as s:
+        response = scheduler.call(
+            "gemini", gemini.beta.chat.completions.parse,
+            model="gemini-2.0-flash",
+            messages=messages,
+            response_format=Evaluation,
+            priority=priority
+        )
+        s.record_usage(response.usage)
+        s.set(acceptable=response.choices[0].message.parsed.is_acceptable)
+    report_usage("evaluate", response.usage)
     return response.choices[0].message.parsed
 
+# Local checks decide whether a reply needs the remote evaluator at all
+# (EVALUATOR_GATE=off sends every reply; see evaluator_gate.py)
+gate = EvaluatorGate("\n".join([summary, linkedin, *(d.text for d in documents)]), remote=evaluate, verdict=Evaluation)
+
 # ---------------------------
 # Step 6: Retry mechanism
 # ---------------------------
 def rerun(reply, message, history, feedback):
-    updated_system_prompt = system_prompt + "\n\n## Previous answer rejected\n"
-    updated_system_prompt += f"## Your attempted answer:\n{reply}\n\n"
-    updated_system_prompt += f"## Reason for rejection:\n{feedback}\n\n"
+    # The rejection goes after the history so the cached prefix is untouched
+    rejection = "## Previous answer rejected\n"
+    rejection += f"## Your attempted answer:\n{reply}\n\n"
+    rejection += f"## Reason for rejection:\n{feedback}\n\n"
 
-    messages = [{"role": "system", "content": updated_system_prompt}] + \
-            history + [{"role": "user", "content": message}]
+    extra = join_extra(relevant_context(message, history), rejection)
+    messages = persona.messages(message, fit_history(message, history, extra), extra=extra)
     
-    response = openai.chat.completions.create(model="gpt-4o-mini", messages=messages)
+    with span("rerun", kind="rerun", provider="openai", model="gpt-4o-mini") as s:
+        response = hedged_chat.create_sync(model="gpt-4o-mini", messages=messages)
+        s.record_usage(response.usage)
+    report_usage("rerun", response.usage)
     return response.choices[0].message.content
 
 # ---------------------------
 # Step 7: Chat function (with evaluation loop)
 # ---------------------------
-def chat(message, history):
+@traced("evaluator.chat", kind="chat")
+def chat(message, history, request: gr.Request = None):
+    # The stored session replaces the history the browser sent
+    session_id = session_id_of(request)
+    history = sessions.history(session_id, history)
+
+    # Repeated question? Skip both the generation and the evaluation
+    reply = cache.get(message, history)
+    if reply is None:
+        reply = answer(message, history)
+        cache.put(message, history, reply)
+    sessions.append(session_id, {"role": "user", "content": message}, {"role": "assistant", "content": reply})
+    return reply
+
+def answer(message, history):
     # Example of special behavior
-    if "patent" in message.lower():
-        system = system_prompt + "\n\nEverything in your reply must be in pig latin."
-    else:
-        system = system_prompt
+    rule = PIG_LATIN_RULE if "patent" in message.lower() else None
+
+    extra = join_extra(relevant_context(message, history), rule)
+    messages = persona.messages(message, fit_history(message, history, extra), extra=extra)
 
-    messages = [{"role": "system", "content": system}] + history + [{"role": "user", "content": message}]
-    response = openai.chat.completions.create(model="gpt-4o-mini", messages=messages)
+    if SPECULATIVE_CANDIDATES > 1:
+        return speculative_chat(messages, message, history)
+    if STREAMING_EVALUATION:
+        return streamed_chat(messages, message, history)
+
+    # Hedged: a slow or failing gpt-4o-mini is backed up by another provider (see hedging.py)
+    with span("chat.completion", kind="model", provider="openai", model="gpt-4o-mini") as s:
+        response = hedged_chat.create_sync(model="gpt-4o-mini", messages=messages)
+        s.record_usage(response.usage)
+    report_usage("chat", response.usage)
     reply = response.choices[0].message.content
 
     # Run evaluation
-    evaluation = evaluate(reply, message, history)
+    evaluation = gate.evaluate(reply, message, history)
     
     if evaluation.is_acceptable:
         print("✅ Passed evaluation - returning reply")
+        print(f"📊 {gate.summary()}")
     else:
         print("❌ Failed evaluation - retrying")
         print("Feedback:", evaluation.feedback)
@@ -129,7 +220,78 @@ def chat(message, history):
     
     return reply
 
+def streamed_chat(messages, message, history):
+    # Local checks on every chunk, remote checks of risky prefixes at checkpoints
+    monitor = gate.monitor(message, history)
+    with span("chat.completion", kind="model", provider="openai", model="gpt-4o-mini", streamed=True) as s:
+        reply, usage = hedged_chat.stream_text_sync(monitor.feed, model="gpt-4o-mini", messages=messages)
+        s.set(aborted=monitor.violation is not None, reply_chars=len(reply))
+        if usage is not None:
+            s.record_usage(usage)
+            report_usage("chat", usage)
+
+    if monitor.violation is not None:
+        # Cut off mid-generation: rerun straight away with the feedback
+        print(f"✂️ Aborted after {len(reply)} chars - retrying")
+        print("Feedback:", monitor.violation)
+        return rerun(reply, message, history, monitor.violation)
+
+    evaluation = monitor.finish(reply)
+    if evaluation.is_acceptable:
+        print("✅ Passed evaluation - returning reply")
+        print(f"📊 {gate.summary()}")
+        return reply
+    print("❌ Failed evaluation - retrying")
+    print("Feedback:", evaluation.feedback)
+    return rerun(reply, message, history, evaluation.feedback)
+
+def speculative_chat(messages, message, history):
+    # Generate all candidates in a single request
+    with span("chat.completion", kind="model", provider="openai", model="gpt-4o-mini", n=SPECULATIVE_CANDIDATES) as s:
+        response = scheduler.call(
+            "openai", openai.chat.completions.create,
+            model="gpt-4o-mini", messages=messages, n=SPECULATIVE_CANDIDATES
+        )
+        s.record_usage(response.usage)
+    report_usage("chat", response.usage)
+    candidates = [choice.message.content for choice in response.choices]
+
+    # Evaluate every candidate at once and take the first acceptable one
+    futures = {
+        executor.submit(contextvars.copy_context().run, gate.evaluate, reply, message, history): reply
+        for reply in candidates
+    }
+    rejected = []
+    for future in as_completed(futures):
+        reply = futures[future]
+        try:
+            evaluation = future.result()
+        except Exception as e:
+            print("⚠️ Evaluation failed:", e)
+            continue
+        if evaluation.is_acceptable:
+            print(f"✅ Passed evaluation - returning 1 of {len(candidates)} candidates")
+            for other in futures:
+                other.cancel()
+            return reply
+        rejected.append((reply, evaluation.feedback))
+
+    # Every candidate was rejected (or could not be evaluated)
+    print("❌ All candidates failed evaluation - retrying")
+    if rejected:
+        reply, feedback = rejected[0]
+    else:
+        reply, feedback = candidates[0], "The evaluator could not be reached."
+    print("Feedback:", feedback)
+    return rerun(reply, message, history, feedback)
+
 # ---------------------------
 # Step 8: Launch Gradio app
 # ---------------------------
-gr.ChatInterface(chat, type="messages").launch()
\ No newline at end of file
+def main():
+    start_metrics_server()   # Prometheus /metrics if METRICS_PORT is set
+    gr.ChatInterface(chat, type="messages").launch()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+# ======================================
+# Evaluator gating
+# ======================================
+# Sending every reply to the remote evaluator roughly doubles latency and
+# cost per turn. EvaluatorGate runs cheap local checks first and only calls
+# the remote evaluator when a reply looks risky:
+# - length/format rules (empty, very short, very long, leaked code fences)
+# - the pig-latin rule for messages mentioning "patent"
+# - lexical grounding: capitalised names, numbers and acronyms in the reply
+#   should appear in the profile text or the user's message
+#
+# Replies that pass are returned without a remote call. A sample of them is
+# still audited by the remote evaluator in the background, so we can see how
+# often the gate would have disagreed. Verdicts are cached per reply/message.
+#
+# Streamed replies are checked while they arrive (StreamMonitor): the local
+# checks run on every chunk and risky prefixes are sent to the remote
+# evaluator at checkpoints, so a bad reply can be cut off and rerun before
+# it has finished generating.
+#
+# EVALUATOR_GATE=off       -> always call the remote evaluator (old behaviour)
+# EVALUATOR_AUDIT_RATE=0.1 -> fraction of skipped replies audited in the background
+
+import contextvars
+import hashlib
+import os
+import random
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from rate_limits import BATCH
+
+GATE_ENABLED = os.getenv("EVALUATOR_GATE", "on") != "off"
+AUDIT_RATE = float(os.getenv("EVALUATOR_AUDIT_RATE", "0.1"))
+
+MIN_CHARS = 2
+MAX_CHARS = 4000
+PIG_LATIN_RATIO = 0.6          # Share of words that must look like pig latin
+MAX_UNGROUNDED = 1             # Unknown names/numbers tolerated before escalating
+STREAM_MIN_WORDS = 12          # Words streamed before the pig-latin rule is judged
+CHECKPOINT_CHARS = int(os.getenv("EVALUATOR_CHECKPOINT_CHARS", "400"))   # Prefix length between remote checks
+MAX_CHECKPOINTS = 2            # Remote checks per streamed reply
+
+PIG_LATIN_FEEDBACK = "Everything in the reply must be in pig latin."
+
+WORD_RE = re.compile(r"[A-Za-z']+")
+CLAIM_RE = re.compile(r"\b(?:[A-Z][A-Za-z0-9+#.&-]*[A-Za-z0-9+#]|[A-Z]{2,}|\d[\d.,%+]*)")
+CHARACTER_RE = re.compile(r"\bas an ai\b|\blanguage model\b", re.IGNORECASE)
+SENTENCE_RE = re.compile(r"[^.!?\n]+[.!?\n]")
+# Phrases naming an employer ("worked at X", "joined X") or a certification ("X certification")
+EMPLOYER_RE = re.compile(
+    r"\b(?:work(?:ed|ing|s)?\s+(?:at|for)|employed\s+(?:at|by)|joined|"
+    r"intern(?:ed|ship)?\s+(?:at|with)|(?:job|role|position)\s+(?:at|with))\s+"
+    r"((?:[A-Z][\w&.+-]*\s*){1,4})"
+)
+CERTIFICATION_RE = re.compile(r"\b(?:certif\w*|credential\w*|licen[cs]\w*|accredit\w*)\b", re.IGNORECASE)
+
+# Capitalised words that carry no factual claim
+COMMON_WORDS = set("""
+i i'm i've i'd i'll im hi hello hey thanks thank yes no sure great absolutely certainly
+my me we our you your it its this that these those there here the a an and or but if so
+as in on at for to of with by from about feel free please let happy glad also however
+currently additionally overall linkedin profile website email
+""".split())
+
+
+@dataclass
+class GateDecision:
+    needs_remote: bool                 # Escalate to the remote evaluator
+    acceptable: bool = True            # Local verdict when not escalated
+    reasons: list = field(default_factory=list)
+
+
+def tokens_of(text):
+    return {t.lower() for t in re.findall(r"[A-Za-z0-9+#]+", text)}
+
+
+def is_pig_latin(text):
+    """
+    True if most words end the way pig latin words do ("-ay", "-way", "-yay").
+    """
+    words = [w.lower().strip("'") for w in WORD_RE.findall(text) if len(w) > 1]
+    if not words:
+        return False
+    matches = sum(1 for w in words if w.endswith("ay"))
+    return matches / len(words) >= PIG_LATIN_RATIO
+
+
+def ungrounded_claims(reply, known):
+    """
+    Capitalised names, acronyms and numbers in the reply that do not appear
+    in the known vocabulary (profile + user message).
+    """
+    claims = []
+    for match in CLAIM_RE.finditer(reply):
+        word = match.group(0).rstrip(".,")
+        lowered = word.lower()
+        if lowered in COMMON_WORDS or lowered in known:
+            continue
+        # Skip ordinary words that are only capitalised because they start a sentence
+        before = reply[:match.start()].rstrip()
+        if word[0].isalpha() and (not before or before[-1] in ".!?:\n-*#") and not word.isupper():
+            continue
+        if any(part in known for part in tokens_of(word)):
+            continue
+        claims.append(word)
+    return claims
+
+
+class EvaluatorGate:
+    """
+    Decides per reply whether the remote evaluator is needed.
+    """
+
+    def __init__(self, profile_text, remote, verdict, audit_rate=AUDIT_RATE,
+                 enabled=GATE_ENABLED, max_cached=2048):
+        self.known = tokens_of(profile_text)
+        self.remote = remote                   # remote(reply, message, history, priority=..., partial=...) -> Evaluation
+        self.verdict = verdict                 # Evaluation class
+        self.audit_rate = audit_rate
+        self.enabled = enabled
+        self.max_cached = max_cached
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.auditor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="audit")
+        self.checkpointer = ThreadPoolExecutor(max_workers=4, thread_name_prefix="checkpoint")
+        self.stats = {"evaluations": 0, "remote": 0, "skipped": 0, "local_rejects": 0,
+                      "cache_hits": 0, "audits": 0, "audit_disagreements": 0,
+                      "streams": 0, "stream_aborts": 0, "checkpoints": 0}
+
+    # ---------------------------
+    # Local checks
+    # ---------------------------
+    def check(self, reply, message):
+        reply = reply or ""
+        text = reply.strip()
+        if len(text) < MIN_CHARS:
+            return GateDecision(False, False, ["The reply is empty."])
+
+        if "patent" in message.lower():
+            if not is_pig_latin(text):
+                return GateDecision(False, False, [PIG_LATIN_FEEDBACK])
+            return GateDecision(False, True, ["pig latin"])
+
+        reasons = []
+        if len(text) > MAX_CHARS:
+            reasons.append("very long reply")
+        if "```" in text:
+            reasons.append("contains a code block")
+        if CHARACTER_RE.search(text):
+            reasons.append("breaks character")
+        claims = ungrounded_claims(text, self.known | tokens_of(message))
+        if len(claims) > MAX_UNGROUNDED:
+            reasons.append(f"not in profile: {', '.join(claims[:5])}")
+        return GateDecision(bool(reasons), True, reasons)
+
+    def check_partial(self, prefix, message, start=0):
+        """
+        Local checks on the part of a reply streamed so far, for complete
+        sentences from `start` on (earlier ones were checked on previous chunks).
+        Returns (reason to abort or None, employer/certification names that are
+        not in the profile, whether the new sentences look risky). Only the
+        pig-latin rule aborts on its own; StreamMonitor decides about the rest.
+        """
+        if "patent" in message.lower():
+            words = WORD_RE.findall(prefix[:prefix.rfind(" ") + 1])     # Last word may be cut off
+            if len(words) >= STREAM_MIN_WORDS and not is_pig_latin(" ".join(words)):
+                return PIG_LATIN_FEEDBACK, [], False
+            return None, [], False
+
+        claims, risky, known = [], False, None
+        for sentence in SENTENCE_RE.findall(prefix, start):
+            risky = risky or bool(CHARACTER_RE.search(sentence))
+            employers = EMPLOYER_RE.findall(sentence)
+            certified = CERTIFICATION_RE.search(sentence)
+            if not employers and not certified:
+                continue
+            known = known or self.known | tokens_of(message)
+            named = ungrounded_claims(sentence, known) if certified else []
+            for employer in employers:                  # The name right after "worked at", as one claim
+                words = [w.rstrip(".,") for w in CLAIM_RE.findall(employer)]
+                if any(w.lower() not in COMMON_WORDS and not tokens_of(w) & known for w in words):
+                    named.append(" ".join(words))
+            claims += [name for name in named if name not in claims]
+        return None, claims, risky or bool(claims)
+
+    def monitor(self, message, history):
+        """
+        A StreamMonitor for one streamed reply to `message`.
+        """
+        self._count("streams")
+        return StreamMonitor(self, message, history)
+
+    # ---------------------------
+    # Evaluation
+    # ---------------------------
+    def key(self, reply, message):
+        return hashlib.sha256(f"{message}\x00{reply}".encode("utf-8")).hexdigest()
+
+    def evaluate(self, reply, message, history):
+        """
+        Drop-in replacement for the remote evaluate(): local checks first,
+        remote evaluation only when needed. Returns an Evaluation.
+        """
+        key = self.key(reply, message)
+        with self.lock:
+            self.stats["evaluations"] += 1
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return self.cache[key]
+
+        if not self.enabled:
+            evaluation = self._remote(reply, message, history)
+        else:
+            decision = self.check(reply, message)
+            if decision.needs_remote:
+                print("🔎 Escalating to evaluator:", "; ".join(decision.reasons))
+                evaluation = self._remote(reply, message, history)
+            elif not decision.acceptable:
+                self._count("local_rejects")
+                evaluation = self.verdict(is_acceptable=False, feedback=" ".join(decision.reasons))
+            else:
+                self._count("skipped")
+                evaluation = self.verdict(is_acceptable=True, feedback="Passed local checks.")
+                if random.random() < self.audit_rate:
+                    self.auditor.submit(self._audit, reply, message, history)
+
+        self._remember(key, evaluation)
+        return evaluation
+
+    def _remote(self, reply, message, history):
+        self._count("remote")
+        return self.remote(reply, message, history)
+
+    def _audit(self, reply, message, history):
+        """
+        Background check of a skipped reply; counts disagreements with the gate.
+        """
+        try:
+            evaluation = self.remote(reply, message, history, priority=BATCH)   # Behind live chat turns
+        except Exception as e:
+            print("⚠️ Audit evaluation failed:", e)
+            return
+        self._count("audits")
+        if not evaluation.is_acceptable:
+            self._count("audit_disagreements")
+            print("⚠️ Audit disagreed with the gate:", evaluation.feedback)
+        self._remember(self.key(reply, message), evaluation)
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _remember(self, key, evaluation):
+        with self.lock:
+            self.cache[key] = evaluation
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_cached:
+                self.cache.popitem(last=False)
+
+    # ---------------------------
+    # Reporting
+    # ---------------------------
+    def summary(self):
+        """
+        Skip rate and audit disagreement rate as a one-line string.
+        """
+        s = self.stats
+        decided = max(1, s["evaluations"] - s["cache_hits"])
+        skip_rate = (s["skipped"] + s["local_rejects"]) / decided
+        disagreement = s["audit_disagreements"] / s["audits"] if s["audits"] else 0.0
+        summary = (f"evaluator skipped {skip_rate:.0%} of {decided} replies, "
+                   f"audits disagreed {disagreement:.0%} of {s['audits']}")
+        if s["streams"]:
+            summary += f", {s['stream_aborts']} of {s['streams']} streams aborted early"
+        return summary
+
+
+class StreamMonitor:
+    """
+    Checks one reply while it streams in. feed() is called with the text so
+    far after every chunk and returns the reason to abort (also kept in
+    `violation`), or None to keep going.
+    """
+
+    def __init__(self, gate, message, history, checkpoint_chars=CHECKPOINT_CHARS,
+                 max_checkpoints=MAX_CHECKPOINTS):
+        self.gate = gate
+        self.message = message
+        self.history = history
+        self.checkpoint_chars = checkpoint_chars
+        self.max_checkpoints = max_checkpoints
+        self.next_checkpoint = checkpoint_chars
+        self.checked = 0                  # Text before this offset has been checked sentence by sentence
+        self.claims = []                  # Employers/certifications named so far that are not in the profile
+        self.pending = []                 # Remote evaluations of earlier prefixes
+        self.violation = None
+
+    def feed(self, text):
+        """
+        Aborts on a pig-latin violation or the first employer/certification
+        that is not in the profile; anything else that looks risky is sent to
+        the remote evaluator straight away instead.
+        """
+        if self.violation is None:
+            violation, claims, risky = self.gate.check_partial(text, self.message, self.checked)
+            self.claims += [c for c in claims if c not in self.claims]
+            if violation is None and self.claims:
+                violation = (f"The reply mentions employers or certifications that are not in the profile: "
+                             f"{', '.join(self.claims[:5])}. Only mention what the profile contains.")
+            self.violation = violation or self._remote_verdict()
+            end = max(text.rfind(c) for c in ".!?\n") + 1
+            self.checked = max(self.checked, end)
+            if self.violation is None and risky:
+                self._checkpoint(text[:end].rstrip(), force=True)
+            elif self.violation is None and len(text) >= self.next_checkpoint:
+                self._checkpoint(text[:text.rfind(" ")].rstrip())     # Up to the last complete word
+            if self.violation is not None:
+                self.gate._count("stream_aborts")
+                self.cancel()
+        return self.violation
+
+    def finish(self, reply):
+        """
+        Final verdict for a reply that streamed to the end without a violation.
+        """
+        violation = self._remote_verdict(wait=True)
+        if violation is not None:
+            return self.gate.verdict(is_acceptable=False, feedback=violation)
+        return self.gate.evaluate(reply, self.message, self.history)
+
+    def cancel(self):
+        for future in self.pending:
+            future.cancel()
+
+    def _checkpoint(self, prefix, force=False):
+        """
+        Sends a prefix to the remote evaluator if it looks risky (`force`, or
+        the gate's full local checks escalate it, or the gate is off).
+        """
+        self.next_checkpoint = len(prefix) + self.checkpoint_chars
+        if len(self.pending) >= self.max_checkpoints:
+            return
+        if not force and self.gate.enabled and not self.gate.check(prefix, self.message).needs_remote:
+            return
+        self.gate._count("checkpoints")
+        run = contextvars.copy_context().run        # Keep the chat turn's trace
+        self.pending.append(self.gate.checkpointer.submit(
+            run, self.gate.remote, prefix, self.message, self.history, partial=True
+        ))
+
+    def _remote_verdict(self, wait=False):
+        """
+        Feedback from the first finished remote checkpoint that rejected its prefix.
+        """
+        for future in self.pending:
+            if not (wait or future.done()) or future.cancelled():
+                continue
+            try:
+                evaluation = future.result()
+            except Exception as e:
+                print("⚠️ Checkpoint evaluation failed:", e)
+                continue
+            if not evaluation.is_acceptable:
+                return evaluation.feedback
+        return None
@@ -0,0 +1,343 @@
+# ======================================
+# Hedged requests and provider failover
+# ======================================
+# One slow gpt-4o-mini response used to set the tail latency of a chat turn.
+# HedgedChat sends the request to the primary route and, if no first token
+# has arrived after a threshold taken from recent time-to-first-token
+# percentiles (completion-time percentiles for non-streamed calls), sends
+# the same request to a backup route (Groq, Gemini, DeepSeek through their
+# OpenAI-compatible endpoints). Whichever produces a token first wins; the
+# other request is cancelled and its stream closed.
+#
+# - timeouts, connection errors, 429s and 5xx fail over to the next backup
+#   straight away; other errors from the primary (a bad request, an auth
+#   error) are raised as they are, since a backup cannot fix them. A backup's
+#   errors never reach the user while other routes are left: the next backup
+#   is tried, and if every route fails the primary's error is raised
+# - backups whose provider has no API key set are skipped
+# - hedges are capped by a budget: at most HEDGE_BUDGET extra requests per
+#   primary request (0.1 = at most 10% added spend), so a degraded primary
+#   cannot double the bill
+# - only the first token is raced; after that the winner streams as usual
+#
+# Async code uses `await chat.create(...)` / `chat.stream(...)`; sync callers
+# use create_sync(), which runs on a background event loop.
+#
+# CHAT_BACKUPS="groq:llama-3.3-70b-versatile,gemini:gemini-2.0-flash"  (empty disables hedging)
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from providers import PROVIDERS, async_client
+from rate_limits import retryable, scheduler
+from tracing import activate, current_span
+
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))   # Percentile of recent TTFT
+HEDGE_DEFAULT_DELAY = 2.0          # Seconds, until enough samples have been seen
+HEDGE_MIN_DELAY = 0.25             # Never hedge sooner than this
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.1"))          # Extra requests per request
+FAILOVER_RETRIES = 1               # Scheduler retries per route before failing over
+MIN_SAMPLES = 20
+WINDOW = 200                       # Recent samples kept per route
+
+
+@dataclass(frozen=True)
+class Route:
+    provider: str      # Key into providers.PROVIDERS
+    model: str
+
+    def __str__(self):
+        return f"{self.provider}:{self.model}"
+
+
+def parse_routes(text):
+    """
+    "groq:llama-3.3-70b-versatile,gemini:gemini-2.0-flash" -> [Route, Route]
+    """
+    routes = []
+    for item in (text or "").split(","):
+        if ":" in item:
+            provider, model = item.strip().split(":", 1)
+            routes.append(Route(provider, model))
+    return routes
+
+
+PRIMARY = Route("openai", "gpt-4o-mini")
+BACKUPS = parse_routes(os.getenv("CHAT_BACKUPS", "groq:llama-3.3-70b-versatile,gemini:gemini-2.0-flash,deepseek:deepseek-chat"))
+
+
+class LatencyTracker:
+    """
+    Recent time-to-first-token samples per route.
+    """
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def observe(self, route, seconds):
+        with self.lock:
+            self.samples.setdefault(route, deque(maxlen=self.window)).append(seconds)
+
+    def threshold(self, route, percentile=HEDGE_PERCENTILE):
+        with self.lock:
+            samples = sorted(self.samples.get(route, ()))
+        if len(samples) < MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        return max(HEDGE_MIN_DELAY, samples[index])
+
+
+class HedgeBudget:
+    """
+    Every request earns `ratio` credits (up to `burst`); a hedge spends one.
+    """
+
+    def __init__(self, ratio=HEDGE_BUDGET, burst=10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.credits = min(1.0, burst)
+        self.lock = threading.Lock()
+
+    def earn(self):
+        with self.lock:
+            self.credits = min(self.burst, self.credits + self.ratio)
+
+    def spend(self):
+        with self.lock:
+            if self.credits < 1.0:
+                return False
+            self.credits -= 1.0
+            return True
+
+
+def configured(route):
+    """
+    True if the route's provider has an API key set (read per request, after load_dotenv).
+    """
+    return bool(os.getenv(PROVIDERS[route.provider].api_key_env))
+
+
+def fails_over(error):
+    """
+    True for errors another route may not have (overload, outage, slowness).
+    """
+    return retryable(error) or isinstance(error, (TimeoutError, asyncio.TimeoutError))
+
+
+def is_first_token(chunk):
+    """
+    True once a chunk carries content, a tool call or a finish reason
+    (the leading role-only chunk arrives before any generation happens).
+    """
+    if not chunk.choices:
+        return False
+    choice = chunk.choices[0]
+    return bool(choice.delta.content or choice.delta.tool_calls or choice.finish_reason)
+
+
+class HedgedChat:
+    """
+    Chat completions with hedging and failover across routes.
+    """
+
+    def __init__(self, primary=PRIMARY, backups=BACKUPS, budget=None):
+        self.primary = primary
+        self.backups = list(backups)
+        self.budget = budget or HedgeBudget()
+        # Time to first token (streamed) and to the whole response (not streamed) are
+        # different metrics, so each mode hedges on its own percentiles
+        self.latency = {True: LatencyTracker(), False: LatencyTracker()}
+        self.stats = {"requests": 0, "hedged": 0, "backup_wins": 0, "failovers": 0, "budget_denied": 0}
+        self._loop = None
+        self._loop_lock = threading.Lock()
+
+    # ---------------------------
+    # Opening one route
+    # ---------------------------
+    async def _open(self, route, kwargs, stream):
+        """
+        Sends the request to one route and waits for its first token (or the
+        whole response, if not streamed). Returns (route, response or stream,
+        chunks read so far, seconds taken).
+        """
+        start = time.perf_counter()
+        client = async_client(route.provider)
+        request = {**kwargs, "model": route.model}
+        if stream:
+            request["stream"] = True
+            if route.provider == "openai":
+                request["stream_options"] = {"include_usage": True}
+        response = await scheduler.acall(route.provider, client.chat.completions.create,
+                                         retries=FAILOVER_RETRIES, **request)
+        if not stream:
+            return route, response, None, time.perf_counter() - start
+
+        buffered = []
+        try:
+            async for chunk in response:
+                buffered.append(chunk)
+                if is_first_token(chunk):
+                    break
+        except BaseException:
+            await response.close()
+            raise
+        return route, response, buffered, time.perf_counter() - start
+
+    async def _race(self, kwargs, stream):
+        """
+        Runs the primary, hedging and failing over as needed, and returns the winner.
+        """
+        self.stats["requests"] += 1
+        self.budget.earn()
+        available = [route for route in self.backups if configured(route)]
+        backups = iter(available)
+        first = self.primary
+        if scheduler.paused_for(self.primary.provider) and available:
+            first = next(backups)                    # Primary is backing off after errors: fail over now
+            self.stats["failovers"] += 1
+        tasks = {asyncio.ensure_future(self._open(first, kwargs, stream)): first}
+        threshold = self.latency[stream].threshold(self.primary)
+        deadline = time.monotonic() + threshold
+        waiting = True                               # Still waiting to decide on a hedge
+        hedged = False
+        errors = {}                                  # route -> exception
+
+        def launch(reason):
+            route = next(backups, None)
+            if route is not None:
+                print(f"↪️ {reason}: trying {route}", flush=True)
+                tasks[asyncio.ensure_future(self._open(route, kwargs, stream))] = route
+            return route
+
+        try:
+            while tasks:
+                timeout = max(0.0, deadline - time.monotonic()) if waiting else None
+                done, _ = await asyncio.wait(tasks, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:                         # Threshold passed without a first token
+                    waiting = False
+                    if not self.budget.spend():
+                        self.stats["budget_denied"] += 1
+                    elif launch(f"no first token from {self.primary} after {threshold:.2f}s"):
+                        self.stats["hedged"] += 1
+                        hedged = True
+                    continue
+
+                for task in done:
+                    route = tasks.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        return task.result(), hedged
+                    errors[route] = error
+                    if route == self.primary and not fails_over(error):
+                        raise error                  # The request itself is wrong: no backup will help
+                    self.stats["failovers"] += 1
+                    waiting = False                  # Failing over replaces the hedge
+                    if not tasks or route == first:
+                        launch(f"{route} failed ({type(error).__name__})")
+            raise errors.get(self.primary) or list(errors.values())[-1]   # Report the primary's error
+        finally:
+            for task in tasks:                       # The losers
+                task.cancel()
+            for task in tasks:
+                task.add_done_callback(_close_stream)
+
+    def _won(self, route, seconds, hedged, trace, stream):
+        self.latency[stream].observe(route, seconds)
+        if route != self.primary:
+            self.stats["backup_wins"] += 1
+        trace = trace or current_span()
+        if trace is not None:
+            trace.provider, trace.model = route.provider, route.model
+            trace.set(hedged=hedged, route=str(route))
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+    async def create(self, trace=None, **kwargs):
+        """
+        Non-streamed chat completion; `model` in kwargs is replaced per route.
+        `trace` is the span to tag with the winning route (default: current span).
+        """
+        (route, response, _, seconds), hedged = await self._race(kwargs, stream=False)
+        self._won(route, seconds, hedged, trace, stream=False)
+        return response
+
+    async def stream(self, trace=None, **kwargs):
+        """
+        Streamed chat completion: yields the winner's chunks.
+        """
+        (route, response, buffered, ttft), hedged = await self._race(kwargs, stream=True)
+        self._won(route, ttft, hedged, trace, stream=True)
+        try:
+            for chunk in buffered:
+                yield chunk
+            async for chunk in response:
+                yield chunk
+        finally:
+            await response.close()
+
+    def stream_text_sync(self, on_text=None, **kwargs):
+        """
+        stream() for synchronous callers: returns (text, usage). on_text(text so far)
+        is called after every chunk; returning a truthy value stops the stream
+        and closes the request, so no more tokens are generated (usage is then None).
+        """
+        context = current_span()
+
+        async def run():
+            with activate(context):
+                text, usage = "", None
+                chunks = self.stream(**kwargs)
+                try:
+                    async for chunk in chunks:
+                        usage = getattr(chunk, "usage", None) or usage
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            text += chunk.choices[0].delta.content
+                            if on_text is not None and on_text(text):
+                                break
+                finally:
+                    await chunks.aclose()
+                return text, usage
+
+        return asyncio.run_coroutine_threadsafe(run(), self.loop()).result()
+
+    def create_sync(self, **kwargs):
+        """
+        create() for synchronous callers, run on a background event loop.
+        """
+        context = current_span()                     # Keep the caller's trace on the loop thread
+
+        async def run():
+            with activate(context):
+                return await self.create(**kwargs)
+
+        return asyncio.run_coroutine_threadsafe(run(), self.loop()).result()
+
+    def loop(self):
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="hedging", daemon=True).start()
+            return self._loop
+
+
+def _close_stream(task):
+    """
+    Closes the stream of a losing route that managed to open one anyway.
+    """
+    if task.cancelled() or task.exception() is not None:
+        return
+    _, response, buffered, _ = task.result()
+    if buffered is not None:
+        asyncio.ensure_future(response.close())
+
+
+# Shared by every chat path in the process
+chat = HedgedChat(backups=BACKUPS)
@@ -0,0 +1,186 @@
+# ======================================
+# Token-budgeted conversation history
+# ======================================
+# Gradio sends the whole history on every turn. Forwarding all of it makes
+# each turn slower and pricier than the last, and long sessions eventually
+# overflow the context window. HistoryManager keeps the most recent turns
+# verbatim and folds older ones into a rolling summary:
+# - tokens are counted locally (prompts.count_tokens)
+# - older messages are folded in blocks of `keep_turns` turns, so the summary
+#   is only updated every few turns and each update only covers new messages
+# - summaries are memoised by a hash of the folded messages, so any session
+#   with the same prefix reuses the work
+# - a hard token budget is applied on top, folding more if needed
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from prompts import count_tokens
+from rate_limits import scheduler
+from tracing import span
+
+KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "4"))            # Verbatim user+assistant turns
+HISTORY_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "6000"))    # Hard cap per request
+SUMMARY_TOKENS = 400                                               # Target size of the summary
+
+
+def message_text(message):
+    content = message.get("content")
+    return content if isinstance(content, str) else ""
+
+
+def message_tokens(message):
+    return count_tokens(message_text(message)) + 4     # + role/formatting overhead
+
+
+def truncate_tokens(text, limit):
+    """
+    Cuts text down to roughly `limit` tokens, keeping the end (the newest part).
+    """
+    while text and count_tokens(text) > limit:
+        text = text[max(1, len(text) // 4):]
+    return text
+
+
+def llm_summarizer(client, model="gpt-4o-mini"):
+    """
+    Returns a summarize(previous_summary, messages) function backed by a chat model.
+    """
+    def summarize(previous, messages):
+        transcript = "\n".join(f"{m['role']}: {message_text(m)}" for m in messages)
+        prompt = "Update the running summary of a website chat with the new messages below. "
+        prompt += "Keep names, email addresses, questions asked and anything promised. "
+        prompt += f"Stay under {SUMMARY_TOKENS} tokens. Reply with the summary only.\n\n"
+        prompt += f"## Current summary:\n{previous or '(none)'}\n\n## New messages:\n{transcript}"
+        with span("history.summary", kind="model", provider="openai", model=model) as s:
+            response = scheduler.call("openai", client.chat.completions.create,
+                                      model=model, messages=[{"role": "user", "content": prompt}])
+            s.record_usage(response.usage)
+        return response.choices[0].message.content
+
+    return summarize
+
+
+def extractive_summarizer(previous, messages):
+    """
+    Fallback without a model: keeps the user's questions and the start of each reply.
+    """
+    lines = [previous] if previous else []
+    for m in messages:
+        text = " ".join(message_text(m).split())
+        if m.get("role") == "user":
+            lines.append(f"User: {text[:300]}")
+        elif m.get("role") == "assistant" and text:
+            lines.append(f"Assistant: {text[:150]}")
+    return truncate_tokens("\n".join(lines), SUMMARY_TOKENS)
+
+
+class HistoryManager:
+    """
+    Compacts a Gradio `messages` history to fit a token budget.
+    """
+
+    def __init__(self, summarize=extractive_summarizer, keep_turns=KEEP_TURNS,
+                 budget=HISTORY_BUDGET, max_summaries=1024):
+        self.summarize = summarize
+        self.keep_messages = 2 * keep_turns
+        self.budget = budget
+        self.max_summaries = max_summaries
+        self.summaries = OrderedDict()      # prefix hash -> summary of history[:n]
+        self.lock = threading.Lock()
+
+    # ---------------------------
+    # Rolling summary
+    # ---------------------------
+    def prefix_hashes(self, messages):
+        """
+        Hash of messages[:i] for every i (index 0 is the empty prefix).
+        """
+        hashes = [""]
+        digest = hashlib.sha256()
+        for m in messages:
+            digest.update(f"{m.get('role')}\x00{message_text(m)}\x01".encode("utf-8"))
+            hashes.append(digest.copy().hexdigest())
+        return hashes
+
+    def summary_for(self, folded):
+        """
+        Summary of `folded`, built on the longest already-summarised prefix.
+        """
+        if not folded:
+            return ""
+        hashes = self.prefix_hashes(folded)
+        with self.lock:
+            if hashes[-1] in self.summaries:
+                self.summaries.move_to_end(hashes[-1])
+                return self.summaries[hashes[-1]]
+            start, previous = 0, ""
+            for i in range(len(folded) - 1, 0, -1):
+                if hashes[i] in self.summaries:
+                    start, previous = i, self.summaries[hashes[i]]
+                    break
+
+        summary = self.summarize(previous, folded[start:])
+        with self.lock:
+            self.summaries[hashes[-1]] = summary
+            while len(self.summaries) > self.max_summaries:
+                self.summaries.popitem(last=False)
+        return summary
+
+    # ---------------------------
+    # Compaction
+    # ---------------------------
+    def split_point(self, history):
+        """
+        How many of the oldest messages to fold. Folding happens in blocks, so
+        between `keep` and `2 * keep` messages stay verbatim.
+        """
+        overflow = len(history) - self.keep_messages
+        if overflow <= 0:
+            return 0
+        block = max(self.keep_messages, 2)
+        split = (overflow // block) * block
+        # Never start the verbatim part on an assistant/tool reply
+        while split < len(history) and history[split].get("role") not in ("user", None):
+            split += 1
+        return split
+
+    def compact(self, history, reserved=0):
+        """
+        Returns (summary, recent messages) within `budget - reserved` tokens.
+        """
+        history = list(history)
+        budget = self.budget - reserved
+        split = self.split_point(history)
+
+        # Fold more turns if the verbatim part alone is over budget
+        tokens = [message_tokens(m) for m in history]
+        while split < len(history) and sum(tokens[split:]) + SUMMARY_TOKENS > budget:
+            split += 1
+            while split < len(history) and history[split].get("role") not in ("user", None):
+                split += 1
+
+        summary = self.summary_for(history[:split])
+        if summary:
+            summary = truncate_tokens(summary, max(0, min(SUMMARY_TOKENS, budget - sum(tokens[split:]))))
+        return summary, history[split:]
+
+    def fit(self, history, reserved=0):
+        """
+        History as chat messages: an optional summary system message + recent turns.
+        """
+        summary, recent = self.compact(history, reserved)
+        if not summary:
+            return recent
+        return [{"role": "system", "content": f"## Summary of the earlier conversation:\n{summary}"}] + recent
+
+    def as_text(self, history, reserved=0):
+        """
+        History formatted as plain text (for the evaluator prompt).
+        """
+        summary, recent = self.compact(history, reserved)
+        text = f"[Summary of earlier conversation]\n{summary}\n\n" if summary else ""
+        text += "\n".join(f"{m['role']}: {message_text(m)}" for m in recent)
+        return text
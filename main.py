@@ -1,6 +1,82 @@
-def main():
-    print("Hello from agentic-ai!")
+# ======================================
+# Command-line entry point
+# ======================================
+# One CLI for every script in the repo:
+#
+#   python main.py chat                        # Persona chatbot (MyChatBot.py)
+#   python main.py evaluate-chat               # Persona chatbot checked by the Gemini evaluator
+#   python main.py compete                     # One generated question, every competitor, judged
+#   python main.py compete --questions q.txt   # A whole question set (competition_batch.py)
+#   python main.py agent                       # Agents SDK joke demo
+#   python main.py agent --prompts p.txt       # Agents SDK batch run (openai_agent_sdk.py)
+#   python main.py simple                      # OpenAI API smoke test (simpleChatbot.py)
+#
+# Nothing heavy is imported here. Each command imports its module only when
+# it runs, so gradio, anthropic, pypdf and IPython are loaded only by the
+# commands that use them, and `python main.py --help` starts instantly.
+# benchmarks/startup.py measures the import time of every command against
+# STARTUP_BUDGETS.
+
+import argparse
+import asyncio
+import importlib
+import inspect
+import sys
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Command:
+    module: str
+    function: str
+    help: str
+    with_args: tuple = None     # (module, function) taking argv, used when extra arguments are given
+
+
+COMMANDS = {
+    "chat": Command("MyChatBot", "main", "persona chatbot web UI"),
+    "evaluate-chat": Command("evaluator_agent", "main", "persona chatbot with evaluator and rerun"),
+    "compete": Command("orchestrator_multiple_llm", "main", "LLM competition (add --questions/--generate for a set)",
+                       with_args=("competition_batch", "main")),
+    "agent": Command("openai_agent_sdk", "main", "Agents SDK demo (add --prompts for a batch run)",
+                     with_args=("openai_agent_sdk", "cli")),
+    "simple": Command("simpleChatbot", "main", "OpenAI API smoke test"),
+}
+
+# Seconds to import each command's module (cold, no .env), tracked by benchmarks/startup.py
+STARTUP_BUDGETS = {
+    "main": 0.1,
+    "chat": 6.0,
+    "evaluate-chat": 6.0,
+    "compete": 2.0,
+    "agent": 3.0,
+    "simple": 1.5,
+}
+
+
+def load(name, with_args=False):
+    """
+    Imports a command's module and returns its entry point (sync or async).
+    """
+    command = COMMANDS[name]
+    module, function = command.with_args if with_args and command.with_args else (command.module, command.function)
+    return getattr(importlib.import_module(module), function)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Agentic AI demos")
+    subparsers = parser.add_subparsers(dest="command", metavar="command", required=True)
+    for name, command in COMMANDS.items():
+        # Commands with their own options get everything after the command name (--help included)
+        subparsers.add_parser(name, help=command.help, add_help=command.with_args is None)
+    args, extra = parser.parse_known_args(argv)
+
+    if extra and not COMMANDS[args.command].with_args:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    result = load(args.command, with_args=True)(extra) if extra else load(args.command)()
+    if inspect.isawaitable(result):           # async entry points (openai_agent_sdk.main)
+        asyncio.run(result)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,231 @@
+# ======================================
+# Background Pushover notifications
+# ======================================
+# Tool handlers call push(), which used to block the chat loop on an HTTP
+# round trip to Pushover. The dispatcher below queues messages instead and a
+# background thread sends them:
+# - one pooled requests.Session (keep-alive) with a timeout on every call
+# - bursts arriving within `batch_window` seconds are coalesced into one message
+# - failed sends are retried with exponential backoff
+# - if the endpoint stays down, messages are appended to a spill file on disk
+#   and re-sent on the next successful delivery, the next start, or the
+#   worker's periodic retry (every PUSHOVER_SPILL_RETRY seconds while idle)
+#
+# PUSHOVER_URL can point at a local stand-in server for testing.
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+PUSHOVER_URL = os.getenv("PUSHOVER_URL", "https://api.pushover.net/1/messages.json")
+SPILL_FILE = Path(os.getenv("PUSHOVER_SPILL_FILE", ".cache/notifications.jsonl"))
+SPILL_RETRY_SECONDS = float(os.getenv("PUSHOVER_SPILL_RETRY", "60"))   # 0 = only replay after a send/start
+MAX_MESSAGE_CHARS = 1024          # Pushover's limit per message
+
+
+class NotificationDispatcher:
+    """
+    Non-blocking, batching sender for Pushover-style notifications.
+    """
+
+    def __init__(self, url=PUSHOVER_URL, token=None, user=None, max_queue=1000,
+                 batch_window=2.0, max_batch=20, max_retries=4, backoff=0.5,
+                 timeout=5.0, spill_file=SPILL_FILE, spill_retry=SPILL_RETRY_SECONDS):
+        self.url = url
+        self.token = token or os.getenv("PUSHOVER_TOKEN")
+        self.user = user or os.getenv("PUSHOVER_USER")
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.spill_file = Path(spill_file)
+        self.spill_retry = spill_retry
+
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
+        self.stats = {"queued": 0, "sent_messages": 0, "requests": 0, "retries": 0, "spilled": 0}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = threading.Event()
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+    def send(self, text):
+        """
+        Queues a message and returns immediately. If the queue is full the
+        message goes straight to the spill file instead of blocking.
+        """
+        self.start()
+        try:
+            self.queue.put_nowait(text)
+            self.stats["queued"] += 1
+        except queue.Full:
+            self.spill([text])
+
+    def start(self):
+        """
+        Starts the background sender (once) and replays any spilled messages.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="notifications", daemon=True)
+            self._thread.start()
+        self.replay_spill()
+
+    def flush(self, timeout=None):
+        """
+        Waits until every queued message has been sent or spilled.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def close(self, timeout=10.0):
+        """
+        Flushes the queue and stops the background thread.
+        """
+        self.flush(timeout)
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.session.close()
+
+    # ---------------------------
+    # Background worker
+    # ---------------------------
+    def _run(self):
+        next_replay = time.monotonic() + self.spill_retry
+        while not self._stopping.is_set():
+            try:
+                first = self.queue.get(timeout=0.5)
+            except queue.Empty:
+                # Nothing to send: retry the spill file now and then, so messages
+                # spilled during a quiet period do not wait for the next send
+                if self.spill_retry and time.monotonic() >= next_replay:
+                    next_replay = time.monotonic() + self.spill_retry
+                    self.replay_spill()
+                continue
+
+            # Coalesce whatever else arrives within the batch window
+            batch = [first]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                delivered = self._deliver(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+            if delivered:
+                self.replay_spill()
+
+    def _deliver(self, texts):
+        """
+        Sends a batch as one or more coalesced messages; spills what fails.
+        """
+        delivered = True
+        for group in coalesce(texts):
+            if self._post("\n".join(group)):
+                self.stats["sent_messages"] += len(group)
+            else:
+                self.spill(group)
+                delivered = False
+        return delivered
+
+    def _post(self, message):
+        """
+        POSTs one message, retrying transient failures with backoff.
+        """
+        data = {"token": self.token, "user": self.user, "message": message}
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(self.url, data=data, timeout=self.timeout)
+                self.stats["requests"] += 1
+                if response.status_code < 400:
+                    return True
+                if response.status_code != 429 and response.status_code < 500:
+                    print(f"Notification rejected ({response.status_code}): {response.text[:200]}", flush=True)
+                    return True     # Resending would be rejected again
+            except requests.RequestException as e:
+                print(f"Notification send failed: {e}", flush=True)
+
+            if attempt < self.max_retries:
+                self.stats["retries"] += 1
+                time.sleep(self.backoff * (2 ** attempt) * (0.5 + random.random()))
+        return False
+
+    # ---------------------------
+    # Spill file
+    # ---------------------------
+    def spill(self, texts):
+        """
+        Appends undeliverable messages to the spill file.
+        """
+        with self._lock:
+            self.spill_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.spill_file, "a", encoding="utf-8") as f:
+                for text in texts:
+                    f.write(json.dumps({"time": time.time(), "message": text}) + "\n")
+        self.stats["spilled"] += len(texts)
+
+    def replay_spill(self):
+        """
+        Moves spilled messages back onto the queue (oldest first).
+        """
+        with self._lock:
+            if not self.spill_file.exists():
+                return 0
+            replaying = self.spill_file.with_name(self.spill_file.name + ".replay")
+            os.replace(self.spill_file, replaying)
+        with open(replaying, encoding="utf-8") as f:
+            texts = [json.loads(line)["message"] for line in f if line.strip()]
+        os.remove(replaying)
+
+        for index, text in enumerate(texts):
+            try:
+                self.queue.put_nowait(text)
+            except queue.Full:
+                self.spill(texts[index:])
+                break
+        return len(texts)
+
+
+def coalesce(texts, limit=MAX_MESSAGE_CHARS):
+    """
+    Groups texts so each joined group stays within the message size limit.
+    """
+    groups, current, size = [], [], 0
+    for text in texts:
+        extra = len(text) + (1 if current else 0)
+        if current and size + extra > limit:
+            groups.append(current)
+            current, size = [], 0
+            extra = len(text)
+        current.append(text)
+        size += extra
+    if current:
+        groups.append(current)
+    return groups
@@ -3,8 +3,8 @@
 # import asyncio
 # # 1. Define your agent in one line
 # agent = Agent(
-#     name="Jokester", 
-#     instructions="You are a joke teller", 
+#     name="Jokester",
+#     instructions="You are a joke teller",
 #     model="gpt-4o-mini"
 # )
 # # 2. Run it with context and tracing
@@ -15,9 +15,25 @@
 
 # The imports
 
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import signal
+import sys
+import time
+import uuid
+from itertools import islice
+from pathlib import Path
+
 from dotenv import load_dotenv
 from agents import Agent, Runner, trace
 
+from prompts import count_tokens
+from rate_limits import BATCH, COMPLETION_ESTIMATE, scheduler
+from tracing import span
+
 # The usual starting point
 
 load_dotenv(override=True)
@@ -29,11 +45,219 @@ agent = Agent(name="Jokester", instructions="You are a joke teller", model="gpt-
 
 # Run the joke with Runner.run(agent, prompt) then print final_output
 
-import asyncio
-
 async def main():
     with trace("Telling a joke"):
         result = await Runner.run(agent, "Tell a joke about Autonomous AI Agents")
         print(result.final_output)
 
-asyncio.run(main())
\ No newline at end of file
+
+# ======================================
+# Batch runs
+# ======================================
+# Pushes a whole workload of prompts through an agent instead of one:
+# - prompts come from a file (.txt: one per line, .jsonl: {"prompt": ..., "id": ...})
+#   or any iterator, and are read lazily, so the workload can be larger than memory
+# - up to `concurrency` Runner.run calls are in flight, each going through
+#   the rate-limit scheduler at BATCH priority
+# - every final_output is appended to the output JSONL as soon as its run
+#   finishes; prompts whose id is already in the file are skipped, so a rerun
+#   resumes where a crash or Ctrl-C left off
+# - runs are grouped into Agents SDK traces of `batch_size` prompts, all
+#   sharing one group_id per invocation
+#
+#   python openai_agent_sdk.py --prompts prompts.txt --output .cache/agent_runs.jsonl
+#
+# Output records (one JSON object per line):
+#   {"id": ..., "prompt": ..., "final_output": ..., "seconds": ..., "batch": ...}
+# Failed runs are printed but not recorded, so they are retried on the next run.
+
+AGENT_OUTPUT = os.getenv("AGENT_BATCH_OUTPUT", ".cache/agent_runs.jsonl")
+AGENT_CONCURRENCY = 8        # Runner.run calls in flight at once
+AGENT_BATCH_SIZE = 25        # Prompts per trace
+AGENT_TIMEOUT = 120.0        # Seconds per run
+
+
+def prompt_id(prompt):
+    return hashlib.sha256(prompt.strip().encode("utf-8")).hexdigest()[:12]
+
+
+def read_prompts(path):
+    """
+    Yields (id, prompt) from a .txt (one prompt per line) or .jsonl file; "-" reads stdin.
+    """
+    jsonl = path.endswith(".jsonl")
+    with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if jsonl:
+                record = json.loads(line)
+                yield str(record.get("id") or prompt_id(record["prompt"])), record["prompt"]
+            else:
+                yield prompt_id(line), line
+
+
+def as_pairs(prompts):
+    """
+    Accepts plain prompt strings or (id, prompt) pairs.
+    """
+    for item in prompts:
+        yield (prompt_id(item), item) if isinstance(item, str) else item
+
+
+class AgentResults:
+    """
+    Append-only JSONL of finished runs; the ids in it are done.
+    """
+
+    def __init__(self, path=AGENT_OUTPUT):
+        self.path = Path(path)
+        self.done = set()
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        self.done.add(json.loads(line)["id"])
+                    except (json.JSONDecodeError, KeyError):
+                        continue              # Torn last line from a crash
+
+    def append(self, record):
+        self.done.add(record["id"])
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class BatchAgentRunner:
+    """
+    Runs prompts through an agent with bounded concurrency; cancel() stops it.
+    """
+
+    def __init__(self, agent, results=None, concurrency=AGENT_CONCURRENCY,
+                 batch_size=AGENT_BATCH_SIZE, timeout=AGENT_TIMEOUT, workflow=None):
+        self.agent = agent
+        self.results = results or AgentResults()
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.workflow = workflow or f"{agent.name} batch"
+        self.group_id = uuid.uuid4().hex
+        self.stats = {"completed": 0, "failed": 0, "skipped": 0}
+        self.cancelled = False
+        self.tasks = set()
+
+    def cancel(self):
+        """
+        Stops reading prompts and cancels the runs in flight (they are retried on resume).
+        """
+        if self.cancelled:
+            return
+        self.cancelled = True
+        print("🛑 Cancelling: finished runs are kept, the rest resume next time", flush=True)
+        for task in self.tasks:
+            task.cancel()
+
+    async def run_one(self, pid, prompt, number, limit):
+        queued = time.perf_counter()
+        async with limit:
+            with span("agent.run", kind="agent", provider="openai", model=self.agent.model,
+                      queued_since=queued, prompt_id=pid, batch=number):
+                start = time.perf_counter()
+                result = await asyncio.wait_for(
+                    scheduler.acall("openai", Runner.run, self.agent, prompt, priority=BATCH,
+                                    tokens=count_tokens(prompt) + COMPLETION_ESTIMATE),
+                    self.timeout,
+                )
+        self.results.append({"id": pid, "prompt": prompt, "final_output": str(result.final_output),
+                             "seconds": round(time.perf_counter() - start, 3), "batch": number})
+        self.stats["completed"] += 1
+
+    async def run_batch(self, number, batch, limit):
+        """
+        One trace per batch; its runs share the invocation's group_id.
+        """
+        with trace(f"{self.workflow} #{number}", group_id=self.group_id,
+                   metadata={"batch": str(number), "prompts": str(len(batch))}):
+            results = await asyncio.gather(
+                *(self.run_one(pid, prompt, number, limit) for pid, prompt in batch),
+                return_exceptions=True,
+            )
+        for (pid, _), result in zip(batch, results):
+            if isinstance(result, BaseException):
+                self.stats["failed"] += 1
+                print(f"[{pid}] failed: {type(result).__name__}: {result}", flush=True)
+        print(f"Batch #{number} done ({self.stats['completed']} completed so far)", flush=True)
+
+    async def run(self, prompts):
+        """
+        Runs every prompt not already in the results file and returns the stats.
+        """
+        limit = asyncio.Semaphore(self.concurrency)
+        # Enough batches in flight to keep every slot busy, without reading the whole input
+        batches_in_flight = asyncio.Semaphore(-(-self.concurrency // self.batch_size) + 1)
+        pending = self.pending(as_pairs(prompts))
+        number = 0
+        with span("agent.batch", kind="agent", workflow=self.workflow, group_id=self.group_id):
+            while not self.cancelled:
+                await batches_in_flight.acquire()
+                batch = list(islice(pending, self.batch_size))
+                if not batch or self.cancelled:
+                    batches_in_flight.release()
+                    break
+                number += 1
+                task = asyncio.ensure_future(self.run_batch(number, batch, limit))
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+                task.add_done_callback(lambda _: batches_in_flight.release())
+            if self.tasks:
+                await asyncio.gather(*self.tasks, return_exceptions=True)
+        return self.stats
+
+    def pending(self, pairs):
+        seen = set()
+        for pid, prompt in pairs:
+            if pid in self.results.done or pid in seen:
+                self.stats["skipped"] += 1
+                continue
+            seen.add(pid)
+            yield pid, prompt
+
+
+async def run_prompts(prompts, output=AGENT_OUTPUT, concurrency=AGENT_CONCURRENCY,
+                      batch_size=AGENT_BATCH_SIZE, timeout=AGENT_TIMEOUT, runner_agent=None):
+    """
+    Runs a prompt workload through the agent; Ctrl-C / SIGTERM cancel cleanly.
+    """
+    runner = BatchAgentRunner(runner_agent or agent, AgentResults(output), concurrency, batch_size, timeout)
+    loop = asyncio.get_running_loop()
+    try:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, runner.cancel)
+    except (NotImplementedError, RuntimeError):
+        pass                                  # Windows / not the main thread: Ctrl-C still interrupts
+    start = time.perf_counter()
+    stats = await runner.run(prompts)
+    print(f"{stats} in {time.perf_counter() - start:.1f}s -> {output}", flush=True)
+    return stats
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description="Run the agent once, or over a file of prompts")
+    parser.add_argument("--prompts", help="prompt file (.txt one per line, .jsonl {'prompt': ...}, '-' for stdin)")
+    parser.add_argument("--output", default=AGENT_OUTPUT)
+    parser.add_argument("--concurrency", type=int, default=AGENT_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=AGENT_BATCH_SIZE)
+    parser.add_argument("--timeout", type=float, default=AGENT_TIMEOUT)
+    args = parser.parse_args(argv)
+    if not args.prompts:
+        asyncio.run(main())
+        return
+    asyncio.run(run_prompts(read_prompts(args.prompts), args.output, args.concurrency,
+                            args.batch_size, args.timeout))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,403 @@
+# ======================================
+# Shared profile context loader
+# ======================================
+# Extracting linkedin.pdf with pypdf is the slowest part of starting a
+# chatbot, so the extracted text is cached on disk keyed by the file's
+# content hash. A warm start only stats the files and memory-maps the cached
+# text; pypdf is imported only when a file actually changed.
+#
+# Further documents (resumes, blog exports, project write-ups) can be
+# dropped into PROFILE_DOCS_DIR as .pdf/.txt/.md files. They are ingested
+# into one corpus:
+# - only new or changed files are extracted, in a process pool, with long
+#   PDFs split into page ranges so one big file does not serialise the run
+# - text is normalised (unicode, hyphenation, whitespace) and lines
+#   already seen in the profile or an earlier document are dropped
+# - the result is written to corpus.json, keyed by the hashes of its
+#   sources, so a warm start only stats the files and reads cached text
+#
+#   python profile_context.py profile_docs/     # ingest ahead of time
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+CACHE_DIR = Path(os.getenv("PROFILE_CACHE_DIR", ".cache/profile"))
+DOCS_DIR = os.getenv("PROFILE_DOCS_DIR", "profile_docs")
+INDEX_FILE = "index.json"
+CORPUS_FILE = "corpus.json"
+CORPUS_VERSION = 1            # Bump when normalisation or dedup changes
+DOC_SUFFIXES = (".pdf", ".txt", ".md")
+PAGES_PER_TASK = 8            # PDF pages extracted per process-pool task
+DEDUPE_MIN_WORDS = 4          # Shorter lines are never dropped on their own
+
+
+@dataclass(frozen=True)
+class Document:
+    name: str              # Path relative to the documents directory
+    text: str              # Normalised text, without lines seen earlier
+
+
+@dataclass(frozen=True)
+class ProfileContext:
+    linkedin: str          # Text extracted from the LinkedIn PDF
+    summary: str           # Career summary text
+    content_hash: str      # Hash over all source files (changes when any changes)
+    documents: tuple = ()  # Extra Documents from PROFILE_DOCS_DIR
+
+
+# ---------------------------
+# Helpers
+# ---------------------------
+def file_sha256(path):
+    """
+    Returns the SHA-256 of a file's bytes.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_mapped(path):
+    """
+    Reads a UTF-8 text file through a read-only memory map.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ""
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[:].decode("utf-8")
+
+
+def write_atomic(path, data):
+    """
+    Writes a file via a temp file + rename so readers never see half a file.
+    """
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp.write_text(data, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def extract_pdf_text(path, start=0, stop=None):
+    """
+    Extracts the text of pages [start, stop) of a PDF (pypdf is imported on demand).
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    text = ""
+    for page in reader.pages[start:stop]:
+        page_text = page.extract_text()
+        if page_text:
+            text += page_text
+    return text
+
+
+def pdf_page_count(path):
+    from pypdf import PdfReader
+
+    return len(PdfReader(path).pages)
+
+
+def extract_text(path):
+    """
+    Returns the text content of a PDF or plain-text file.
+    """
+    if Path(path).suffix.lower() == ".pdf":
+        return extract_pdf_text(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+# ---------------------------
+# Cache
+# ---------------------------
+def load_index(cache_dir):
+    try:
+        return json.loads((cache_dir / INDEX_FILE).read_text(encoding="utf-8"))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_index(cache_dir, updates):
+    """
+    Merges index entries into index.json, written atomically.
+    """
+    index = load_index(cache_dir)       # Re-read in case another worker updated it
+    index.update(updates)
+    write_atomic(cache_dir / INDEX_FILE, json.dumps(index, indent=2))
+
+
+def cached_text(path, cache_dir=CACHE_DIR, extract=extract_text, index=None):
+    """
+    Returns (text, sha256) for a source file, extracting it only on a cache miss.
+
+    The index stores each file's size, mtime and hash. If size and mtime are
+    unchanged the stored hash is trusted; otherwise the file is re-hashed and
+    only re-extracted when its content really changed. On a miss the text
+    comes from extract(path); with extract=None, (None, sha256) is returned.
+
+    Callers handling many files pass `index` (from load_index): entries are
+    then checked and updated in that dict, and the caller saves it once.
+    """
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    source = Path(path).resolve()
+    stat = source.stat()
+
+    shared = index is not None
+    index = index if shared else load_index(cache_dir)
+    entry = index.get(str(source))
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        sha = entry["sha256"]
+    else:
+        sha = file_sha256(source)
+
+    text_file = cache_dir / f"{sha}.txt"
+    if text_file.exists():
+        text = read_mapped(text_file)
+    elif extract is None:
+        text = None
+    else:
+        text = extract(source)
+        write_atomic(text_file, text)
+
+    current = {"sha256": sha, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    if entry != current:
+        if shared:
+            index[str(source)] = current
+        else:
+            save_index(cache_dir, {str(source): current})
+
+    return text, sha
+
+
+# ---------------------------
+# Document corpus
+# ---------------------------
+def normalize_text(text):
+    """
+    Unicode-normalised text with words re-joined across line-break hyphens,
+    control characters dropped, and runs of spaces and blank lines collapsed.
+    """
+    text = unicodedata.normalize("NFKC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = re.sub(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]", "", text)
+    text = re.sub(r"(\w)-\n(\w)", r"\1\2", text)
+    text = re.sub(r"[^\S\n]+", " ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def line_key(line):
+    return " ".join(re.findall(r"\w+", line.lower()))
+
+
+def dedupe_lines(text, seen):
+    """
+    Drops lines already seen in the profile or an earlier document (and adds
+    the new ones to `seen`). Lines under DEDUPE_MIN_WORDS words (headings,
+    dates, bullets) are not compared on their own: they go with the nearest
+    longer line before them, so a copied section disappears as a whole.
+    """
+    lines = text.split("\n")
+    keep = []
+    for line in lines:
+        key = line_key(line)
+        if len(key.split()) < DEDUPE_MIN_WORDS:
+            keep.append(None)
+            continue
+        keep.append(key not in seen)
+        seen.add(key)
+    follow = next((k for k in keep if k is not None), True)    # Leading short lines go with the first long one
+    kept = []
+    for line, k in zip(lines, keep):
+        follow = follow if k is None else k
+        if follow:
+            kept.append(line)
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(kept)).strip()
+
+
+def find_documents(directory):
+    """
+    Supported files under `directory`, in a stable order.
+    """
+    root = Path(directory)
+    if not root.is_dir():
+        return []
+    return sorted(p for p in root.rglob("*") if p.is_file() and p.suffix.lower() in DOC_SUFFIXES)
+
+
+def extraction_tasks(path):
+    """
+    (path, start page, stop page) ranges to extract a file in (one range for text files).
+    """
+    if path.suffix.lower() != ".pdf":
+        return [(str(path), 0, None)]
+    pages = pdf_page_count(path)
+    return [(str(path), start, min(start + PAGES_PER_TASK, pages))
+            for start in range(0, max(pages, 1), PAGES_PER_TASK)]
+
+
+def extract_range(task):
+    """
+    Process-pool worker: the text of one page range (or a whole text file).
+    """
+    path, start, stop = task
+    if Path(path).suffix.lower() == ".pdf":
+        return extract_pdf_text(path, start, stop)
+    return extract_text(path)
+
+
+def extract_missing(paths, workers=None):
+    """
+    Extracts files (sha -> path), page ranges in parallel; returns sha -> text.
+    Files that cannot be read are reported and left out.
+    """
+    tasks, failed = [], set()
+    for path in paths.values():
+        try:
+            tasks += extraction_tasks(path)
+        except Exception as e:
+            print(f"⚠️ Skipping {path.name}: {type(e).__name__}: {e}", flush=True)
+            failed.add(str(path))
+
+    workers = min(len(tasks), workers or os.cpu_count() or 1)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        if pool is not None:
+            futures = [pool.submit(extract_range, task) for task in tasks]
+        texts = {}
+        for i, (path, _, _) in enumerate(tasks):          # Ranges are joined in page order
+            try:
+                part = futures[i].result() if pool is not None else extract_range(tasks[i])
+            except Exception as e:
+                if path not in failed:
+                    print(f"⚠️ Skipping {Path(path).name}: {type(e).__name__}: {e}", flush=True)
+                failed.add(path)
+                continue
+            texts[path] = texts.get(path, "") + part
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    return {sha: texts.get(str(path), "") for sha, path in paths.items() if str(path) not in failed}
+
+
+def ingest_documents(directory=DOCS_DIR, cache_dir=CACHE_DIR, seen_text=(), workers=None):
+    """
+    Returns (documents, corpus key) for every supported file under `directory`.
+
+    Each file's text and hash come from cached_text. If the set of hashes
+    matches the stored corpus it is returned as is; otherwise the files
+    without cached text are extracted in parallel, and the corpus is
+    normalised, deduplicated against `seen_text` and earlier documents, and
+    rewritten.
+    """
+    root = Path(directory)
+    paths = find_documents(root)
+    if not paths:
+        return (), ""
+    cache_dir = Path(cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    index = load_index(cache_dir)                      # Read once, saved once at the end
+    loaded = dict(index)
+    sources = []
+    for path in paths:
+        text, sha = cached_text(path, cache_dir, extract=None, index=index)
+        sources.append((path.relative_to(root).as_posix(), sha, path, text))
+
+    seen_hash = hashlib.sha256("\x00".join(seen_text).encode("utf-8")).hexdigest()
+    listing = "\n".join(f"{name}:{sha}" for name, sha, _, _ in sources)
+    key = hashlib.sha256(f"{CORPUS_VERSION}\n{seen_hash}\n{listing}".encode("utf-8")).hexdigest()
+
+    corpus_file = cache_dir / CORPUS_FILE
+    try:
+        corpus = json.loads(read_mapped(corpus_file))
+    except (FileNotFoundError, json.JSONDecodeError):
+        corpus = {}
+    if corpus.get("key") != key:
+        missing = {sha: path for _, sha, path, text in sources if text is None}
+        extracted = {}
+        if missing:
+            start = time.perf_counter()
+            extracted = extract_missing(missing, workers)
+            print(f"Extracted {len(missing)} of {len(sources)} documents in {time.perf_counter() - start:.1f}s",
+                  flush=True)
+
+        seen = set()
+        for text in seen_text:
+            dedupe_lines(normalize_text(text), seen)
+        documents, done = [], set()
+        for name, sha, path, text in sources:
+            if sha in done:                            # Same file under another name
+                continue
+            done.add(sha)
+            if text is None:
+                if sha not in extracted:               # Extraction failed
+                    continue
+                text, _ = cached_text(path, cache_dir, extract=lambda _: extracted[sha], index=index)
+            text = dedupe_lines(normalize_text(text), seen)
+            if text:
+                documents.append({"name": name, "text": text})
+        corpus = {"key": key, "documents": documents}
+        write_atomic(corpus_file, json.dumps(corpus))
+
+    updates = {name: entry for name, entry in index.items() if loaded.get(name) != entry}
+    if updates:
+        save_index(cache_dir, updates)
+
+    return tuple(Document(d["name"], d["text"]) for d in corpus["documents"]), key
+
+
+def profile_sources(linkedin_path="linkedin.pdf", summary_path="summary.txt", docs_dir=DOCS_DIR):
+    """
+    Every file load_profile_context reads (for noticing changes on disk).
+    """
+    return [Path(linkedin_path), Path(summary_path), *find_documents(docs_dir)]
+
+
+@lru_cache(maxsize=None)
+def load_profile_context(linkedin_path="linkedin.pdf", summary_path="summary.txt", docs_dir=DOCS_DIR):
+    """
+    Loads the LinkedIn and summary text, plus the document corpus, once per
+    process (shared by every script).
+    """
+    linkedin, linkedin_sha = cached_text(linkedin_path)
+    summary, summary_sha = cached_text(summary_path)
+    documents, corpus_key = ingest_documents(docs_dir, seen_text=(summary, linkedin))
+    content_hash = hashlib.sha256(f"{linkedin_sha}:{summary_sha}".encode()).hexdigest()
+    if documents:
+        content_hash = hashlib.sha256(f"{content_hash}:{corpus_key}".encode()).hexdigest()
+    return ProfileContext(linkedin=linkedin, summary=summary, content_hash=content_hash, documents=documents)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest the profile documents into the corpus cache")
+    parser.add_argument("directory", nargs="?", default=DOCS_DIR)
+    parser.add_argument("--workers", type=int, help="extraction processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    linkedin, _ = cached_text("linkedin.pdf")
+    summary, _ = cached_text("summary.txt")
+    documents, _ = ingest_documents(args.directory, seen_text=(summary, linkedin), workers=args.workers)
+    chars = sum(len(d.text) for d in documents)
+    print(f"{len(documents)} documents, {chars} characters in {time.perf_counter() - start:.2f}s")
+    for document in documents:
+        print(f"  {document.name}: {len(document.text)} characters")
+
+
+if __name__ == "__main__":
+    main()
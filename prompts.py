@@ -0,0 +1,108 @@
+# ======================================
+# Cache-friendly prompt construction
+# ======================================
+# Providers cache the longest prompt prefix they have seen before, so the big
+# persona/context system message is built once and kept byte-identical across
+# requests. Anything that changes per request (special rules, rejection
+# feedback) goes after the conversation history, never into that prefix.
+
+from functools import cached_property, lru_cache
+
+try:
+    import tiktoken                   # Optional: exact token counts
+except ImportError:
+    tiktoken = None
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model):
+    """
+    Loads the tiktoken encoding for a model once (None if unavailable offline).
+    """
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text, model="gpt-4o-mini"):
+    """
+    Counts tokens locally with tiktoken, or estimates ~4 characters per token.
+    """
+    encoding = get_encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def context_section(summary, linkedin, documents=()):
+    """
+    The profile context block shared by the persona and the evaluator.
+    """
+    section = f"\n\n## Summary:\n{summary}\n\n## LinkedIn Profile:\n{linkedin}\n\n"
+    for document in documents:
+        section += f"## Document: {document.name}\n{document.text}\n\n"
+    return section
+
+
+class PromptBuilder:
+    """
+    Holds a static system prompt prefix and builds per-request message lists.
+    """
+
+    def __init__(self, *sections):
+        self.sections = sections
+
+    @cached_property
+    def prefix(self):
+        """The static system prompt, computed once."""
+        return "".join(self.sections)
+
+    @cached_property
+    def prefix_tokens(self):
+        """Token count of the static prefix."""
+        return count_tokens(self.prefix)
+
+    def messages(self, message, history=(), extra=None):
+        """
+        Builds [static system] + history + [per-request system] + [user].
+        `extra` carries per-request instructions so the prefix stays cacheable.
+        """
+        messages = [{"role": "system", "content": self.prefix}] + list(history)
+        if extra:
+            messages.append({"role": "system", "content": extra})
+        messages.append({"role": "user", "content": message})
+        return messages
+
+
+def usage_stats(usage):
+    """
+    Pulls prompt, completion and cached token counts out of a response's usage.
+    """
+    if usage is None:
+        return {}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", 0) or 0) if details else 0,
+    }
+
+
+def report_usage(label, usage):
+    """
+    Prints how much of the prompt was served from the provider's cache.
+    """
+    stats = usage_stats(usage)
+    if stats:
+        print(
+            f"[{label}] prompt={stats['prompt_tokens']} cached={stats['cached_tokens']} "
+            f"completion={stats['completion_tokens']}",
+            flush=True,
+        )
+    return stats
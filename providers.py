@@ -0,0 +1,118 @@
+# ======================================
+# Shared provider client registry
+# ======================================
+# Every script used to build its own clients at import time, each with its
+# own connection pool. This module is the one place that knows how to reach
+# each provider:
+# - clients are created lazily on first use and then reused
+# - each client gets a keep-alive, pooled HTTP transport, so warm requests
+#   skip TCP/TLS setup
+# - sync and async variants are available (async clients are kept per event
+#   loop, since an async connection pool cannot move between loops)
+#
+# Base URLs can be overridden with <PROVIDER>_BASE_URL, e.g. to point every
+# script at a local stub server, and rate limits with <PROVIDER>_RPM and
+# <PROVIDER>_TPM (enforced by rate_limits.py).
+
+import asyncio
+import os
+import threading
+import weakref
+from dataclasses import dataclass
+
+import httpx
+
+
+@dataclass(frozen=True)
+class Provider:
+    api_key_env: str           # Env var holding the API key
+    base_url: str = None       # None = the SDK's default endpoint
+    sdk: str = "openai"        # "openai" or "anthropic"
+    rpm: int = 500             # Requests per minute for our account tier
+    tpm: int = 200_000         # Tokens per minute
+
+    def url(self, name):
+        return os.getenv(f"{name.upper()}_BASE_URL") or self.base_url
+
+    def limits(self, name):
+        return (int(os.getenv(f"{name.upper()}_RPM", self.rpm)),
+                int(os.getenv(f"{name.upper()}_TPM", self.tpm)))
+
+
+PROVIDERS = {
+    "openai": Provider("OPENAI_API_KEY"),
+    "anthropic": Provider("ANTHROPIC_API_KEY", sdk="anthropic", rpm=50, tpm=40_000),
+    "gemini": Provider("GOOGLE_API_KEY", "https://generativelanguage.googleapis.com/v1beta/openai/", rpm=1000, tpm=1_000_000),
+    "deepseek": Provider("DEEPSEEK_API_KEY", "https://api.deepseek.com/v1", rpm=60, tpm=100_000),
+    "groq": Provider("GROQ_API_KEY", "https://api.groq.com/openai/v1", rpm=30, tpm=6_000),
+}
+
+# Connection pool settings shared by every provider
+POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("PROVIDER_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("PROVIDER_MAX_KEEPALIVE", "20")),
+    keepalive_expiry=float(os.getenv("PROVIDER_KEEPALIVE_SECONDS", "60")),
+)
+REQUEST_TIMEOUT = float(os.getenv("PROVIDER_TIMEOUT", "120"))      # Seconds per request
+
+# Retries (and 429 backoff) are done by rate_limits.scheduler, which pauses the
+# whole provider; SDK-level retries would hide the rate limit from it
+SDK_RETRIES = int(os.getenv("PROVIDER_SDK_RETRIES", "0"))
+
+_lock = threading.Lock()
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()     # event loop -> {provider: client}
+
+
+def _build(name, asynchronous):
+    provider = PROVIDERS[name]
+    api_key = os.getenv(provider.api_key_env)
+    base_url = provider.url(name)
+
+    if provider.sdk == "anthropic":
+        import anthropic                         # Only loaded when Claude is actually used
+
+        if asynchronous:
+            http = anthropic.DefaultAsyncHttpxClient(limits=POOL_LIMITS)
+            return anthropic.AsyncAnthropic(api_key=api_key, base_url=base_url, http_client=http, timeout=REQUEST_TIMEOUT, max_retries=SDK_RETRIES)
+        http = anthropic.DefaultHttpxClient(limits=POOL_LIMITS)
+        return anthropic.Anthropic(api_key=api_key, base_url=base_url, http_client=http, timeout=REQUEST_TIMEOUT, max_retries=SDK_RETRIES)
+
+    import openai
+
+    if asynchronous:
+        http = openai.DefaultAsyncHttpxClient(limits=POOL_LIMITS)
+        return openai.AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http, timeout=REQUEST_TIMEOUT, max_retries=SDK_RETRIES)
+    http = openai.DefaultHttpxClient(limits=POOL_LIMITS)
+    return openai.OpenAI(api_key=api_key, base_url=base_url, http_client=http, timeout=REQUEST_TIMEOUT, max_retries=SDK_RETRIES)
+
+
+def client(name):
+    """
+    Returns the shared sync client for a provider, creating it on first use.
+    """
+    with _lock:
+        if name not in _clients:
+            _clients[name] = _build(name, asynchronous=False)
+        return _clients[name]
+
+
+def async_client(name):
+    """
+    Returns the shared async client for a provider on the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        if name not in clients:
+            clients[name] = _build(name, asynchronous=True)
+        return clients[name]
+
+
+def reset():
+    """
+    Forgets every cached client (e.g. after changing env vars or forking).
+    """
+    with _lock:
+        _clients.clear()
+        _async_clients.clear()
@@ -0,0 +1,340 @@
+# ======================================
+# Per-provider rate-limit scheduler
+# ======================================
+# Every model call goes through `scheduler` instead of hitting the provider
+# directly:
+#
+#     response = scheduler.call("openai", client.chat.completions.create,
+#                               model="gpt-4o-mini", messages=messages)
+#     response = await scheduler.acall("openai", aclient.chat.completions.create, ..., priority=BATCH)
+#
+# - each provider has two token buckets, requests/min and tokens/min
+#   (defaults in providers.PROVIDERS, overridable with <NAME>_RPM / <NAME>_TPM)
+# - the token cost of a call is estimated up front from its messages and
+#   corrected with the real usage once the response arrives
+# - INTERACTIVE calls (chat turns) go ahead of BATCH calls (competition,
+#   judging, background audits): batch work waits while interactive calls are queued
+#   and never uses the last BATCH_HEADROOM of a bucket
+# - on 429/5xx the provider is paused for the retry-after the server asked
+#   for (or an exponential backoff), the bucket rate is lowered to what the
+#   rate-limit headers report, and the call is retried. The rate creeps back
+#   up after successful calls.
+#
+# The SDKs' own retries are turned off in providers.py so retries happen here,
+# where every caller of the provider can see the pause.
+
+import asyncio
+import email.utils
+import os
+import random
+import re
+import threading
+import time
+
+from prompts import count_tokens
+from providers import PROVIDERS
+from tracing import current_span
+
+INTERACTIVE = 0
+BATCH = 1
+
+MAX_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "6"))
+BASE_BACKOFF = 0.5                 # Seconds, doubled on each retry without retry-after
+MAX_BACKOFF = 60.0
+BATCH_HEADROOM = 0.1               # Share of each bucket kept free for interactive calls
+COMPLETION_ESTIMATE = 500          # Tokens assumed for a reply when max_tokens is not set
+SLOWDOWN = 0.75                    # Rate multiplier after a 429 ...
+SLOWDOWN_INTERVAL = 2.0            # ... at most once per this many seconds (429s come in bursts)
+MIN_RATE = 0.1                     # Never drop below this share of the configured limit
+RECOVERY = 1.05                    # Rate multiplier after each successful call
+
+
+class TokenBucket:
+    """
+    Refills at `per_minute / 60` per second up to `per_minute`.
+    Callers hold the scheduler lock.
+    """
+
+    def __init__(self, per_minute):
+        self.limit = float(per_minute)
+        self.rate = self.limit                  # Current (possibly lowered) rate
+        self.level = self.limit
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.rate, self.level + (now - self.updated) * self.rate / 60.0)
+        self.updated = now
+
+    def wait_for(self, amount, reserve=0.0):
+        """
+        Seconds until `amount` can be taken while keeping `reserve` of the bucket free.
+        """
+        if amount >= self.rate * (1.0 - reserve):
+            # Oversized requests (they would never fit next to the reserve) go
+            # once the bucket is full; refill() caps the level at exactly `rate`
+            missing = self.rate - self.level
+        else:
+            missing = amount + reserve * self.rate - self.level
+        return 0.0 if missing <= 0 else missing * 60.0 / self.rate
+
+    def take(self, amount):
+        self.level -= amount                     # May go negative: the debt delays later calls
+
+    def slow_down(self, limit=None):
+        if limit:
+            self.limit = min(self.limit, limit)  # The provider told us our real limit
+        self.rate = max(1.0, self.limit * MIN_RATE, min(self.rate * SLOWDOWN, self.limit))
+        self.level = min(self.level, self.rate)
+
+    def recover(self):
+        self.rate = min(self.limit, self.rate * RECOVERY)
+
+
+class ProviderState:
+    def __init__(self, name):
+        rpm, tpm = PROVIDERS[name].limits(name)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self.slowed_at = 0.0
+        self.waiting = [0, 0]                    # Queued calls per priority class
+
+
+def estimate_tokens(kwargs):
+    """
+    Rough token cost of a chat call: prompt tokens plus the expected reply.
+    """
+    prompt = 0
+    for m in kwargs.get("messages", []):
+        content = m.get("content") if isinstance(m, dict) else getattr(m, "content", None)
+        prompt += (count_tokens(content) if isinstance(content, str) else 0) + 4
+    reply = kwargs.get("max_tokens") or kwargs.get("max_completion_tokens") or COMPLETION_ESTIMATE
+    return prompt + reply * kwargs.get("n", 1)
+
+
+def usage_tokens(response):
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None
+    if hasattr(usage, "input_tokens"):                     # Anthropic
+        return (usage.input_tokens or 0) + (usage.output_tokens or 0)
+    return getattr(usage, "total_tokens", None)
+
+
+def parse_duration(value):
+    """
+    "1.5" / "20ms" / "6m0s" / HTTP date -> seconds (None if unparseable).
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"([\d.]+)(ms|h|m|s)", value)
+    if parts:
+        scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        return sum(float(n) * scale[unit] for n, unit in parts)
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def retry_hint(error):
+    """
+    (retry-after seconds, request limit, token limit) from a rate-limit error's headers.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    retry_after = None
+    if headers.get("retry-after-ms"):
+        retry_after = parse_duration(headers["retry-after-ms"]) / 1000.0
+    retry_after = retry_after or parse_duration(headers.get("retry-after"))
+    if retry_after is None:
+        resets = [parse_duration(headers.get(h)) for h in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")]
+        resets = [r for r in resets if r is not None]
+        retry_after = max(resets) if resets else None
+
+    def number(name):
+        try:
+            return float(headers[name]) if headers.get(name) else None
+        except ValueError:
+            return None
+
+    return retry_after, number("x-ratelimit-limit-requests"), number("x-ratelimit-limit-tokens")
+
+
+def retryable(error):
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class RateLimitScheduler:
+    """
+    Admission control and retries for every provider, shared by threads and event loops.
+    """
+
+    def __init__(self, max_retries=MAX_RETRIES):
+        self.max_retries = max_retries
+        self.lock = threading.Lock()
+        self.providers = {}
+        self.stats = {"calls": 0, "throttled": 0, "wait_seconds": 0.0, "retries": 0, "rate_limited": 0}
+
+    def state(self, provider):
+        if provider not in self.providers:
+            self.providers[provider] = ProviderState(provider)
+        return self.providers[provider]
+
+    # ---------------------------
+    # Admission
+    # ---------------------------
+    def _try_acquire(self, provider, priority, tokens):
+        """
+        Takes capacity and returns 0, or returns how long to wait before trying again.
+        """
+        with self.lock:
+            state = self.state(provider)
+            now = time.monotonic()
+            if state.paused_until > now:
+                return state.paused_until - now
+            if priority == BATCH and state.waiting[INTERACTIVE]:
+                return 0.05
+            reserve = BATCH_HEADROOM if priority == BATCH else 0.0
+            state.requests.refill(now)
+            state.tokens.refill(now)
+            wait = max(state.requests.wait_for(1, reserve), state.tokens.wait_for(tokens, reserve))
+            if wait > 0:
+                return wait
+            state.requests.take(1)
+            state.tokens.take(tokens)
+            self.stats["calls"] += 1
+            return 0.0
+
+    def paused_for(self, provider):
+        """
+        Seconds until a provider paused after errors takes requests again.
+        """
+        with self.lock:
+            return max(0.0, self.state(provider).paused_until - time.monotonic())
+
+    def _queue(self, provider, priority, delta):
+        with self.lock:
+            self.state(provider).waiting[priority] += delta
+
+    def _waited(self, seconds):
+        with self.lock:
+            self.stats["throttled"] += 1
+            self.stats["wait_seconds"] += seconds
+        current = current_span()
+        if current is not None:
+            current.set(rate_limit_wait_ms=round(seconds * 1000, 1))
+
+    # ---------------------------
+    # Feedback from responses
+    # ---------------------------
+    def _succeeded(self, provider, estimate, response):
+        actual = usage_tokens(response)
+        with self.lock:
+            state = self.state(provider)
+            if actual is not None:
+                state.tokens.take(actual - estimate)     # Settle the estimate
+            state.requests.recover()
+            state.tokens.recover()
+
+    def _failed(self, provider, error, attempt):
+        """
+        Pauses the provider after a retryable error; returns the pause in seconds.
+        """
+        retry_after, request_limit, token_limit = retry_hint(error)
+        backoff = retry_after if retry_after is not None else BASE_BACKOFF * 2 ** attempt
+        backoff = min(MAX_BACKOFF, backoff) * random.uniform(1.0, 1.2)
+        with self.lock:
+            state = self.state(provider)
+            now = time.monotonic()
+            state.paused_until = max(state.paused_until, now + backoff)
+            if getattr(error, "status_code", None) == 429:
+                self.stats["rate_limited"] += 1
+                if now - state.slowed_at > SLOWDOWN_INTERVAL:
+                    state.slowed_at = now
+                    state.requests.slow_down(request_limit)
+                    state.tokens.slow_down(token_limit)
+            self.stats["retries"] += 1
+        print(f"⏳ {provider} {type(error).__name__}; retrying in {backoff:.1f}s", flush=True)
+        return backoff
+
+    # ---------------------------
+    # Calls
+    # ---------------------------
+    def call(self, provider, fn, *args, priority=INTERACTIVE, tokens=None, retries=None, **kwargs):
+        """
+        Runs fn(*args, **kwargs) once the provider has capacity, retrying on 429/5xx
+        (up to `retries` times, default max_retries).
+        """
+        tokens = tokens if tokens is not None else estimate_tokens(kwargs)
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            self.acquire(provider, priority, tokens)
+            try:
+                response = fn(*args, **kwargs)
+            except Exception as e:
+                if not retryable(e) or attempt == retries:
+                    raise
+                self._failed(provider, e, attempt)
+                continue
+            self._succeeded(provider, tokens, response)
+            return response
+
+    async def acall(self, provider, fn, *args, priority=INTERACTIVE, tokens=None, retries=None, **kwargs):
+        """
+        Async version of call(); fn returns an awaitable.
+        """
+        tokens = tokens if tokens is not None else estimate_tokens(kwargs)
+        retries = self.max_retries if retries is None else retries
+        for attempt in range(retries + 1):
+            await self.aacquire(provider, priority, tokens)
+            try:
+                response = await fn(*args, **kwargs)
+            except Exception as e:
+                if not retryable(e) or attempt == retries:
+                    raise
+                self._failed(provider, e, attempt)
+                continue
+            self._succeeded(provider, tokens, response)
+            return response
+
+    def acquire(self, provider, priority=INTERACTIVE, tokens=1):
+        wait = self._try_acquire(provider, priority, tokens)
+        if not wait:
+            return
+        self._queue(provider, priority, 1)
+        waited = 0.0
+        try:
+            while wait:
+                time.sleep(min(wait, 1.0))
+                waited += min(wait, 1.0)
+                wait = self._try_acquire(provider, priority, tokens)
+        finally:
+            self._queue(provider, priority, -1)
+        self._waited(waited)
+
+    async def aacquire(self, provider, priority=INTERACTIVE, tokens=1):
+        wait = self._try_acquire(provider, priority, tokens)
+        if not wait:
+            return
+        self._queue(provider, priority, 1)
+        waited = 0.0
+        try:
+            while wait:
+                await asyncio.sleep(min(wait, 1.0))
+                waited += min(wait, 1.0)
+                wait = self._try_acquire(provider, priority, tokens)
+        finally:
+            self._queue(provider, priority, -1)
+        self._waited(waited)
+
+
+scheduler = RateLimitScheduler()
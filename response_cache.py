@@ -0,0 +1,192 @@
+# ======================================
+# Response cache for repeated questions
+# ======================================
+# Most visitors ask the same few questions, so final replies are cached by:
+# - the normalised message
+# - a fingerprint of the last few history messages
+# - the content hash of the profile the process loaded (profile_context.py)
+#
+# Lookups hit an in-memory LRU first and fall back to a SQLite file, so the
+# cache survives restarts. Entries expire after `ttl` seconds, and entries
+# from another profile are dropped at startup. If the profile files change
+# while the process runs, caching stops: the process still answers from the
+# profile it loaded, and those replies must not outlive it. Turns that called
+# tools are never cached (their side effects must run every time).
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from profile_context import profile_sources
+
+CACHE_PATH = Path(os.getenv("RESPONSE_CACHE_PATH", ".cache/responses.sqlite3"))
+CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(24 * 3600)))
+CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "1") == "1"
+HISTORY_TURNS = 2        # History messages that count towards the key
+SOURCE_CHECK_INTERVAL = 5.0   # Seconds between checks of the profile files
+
+
+def normalize(text):
+    """
+    Lowercases, collapses whitespace and drops trailing punctuation.
+    """
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip("?!. ")
+
+
+def history_fingerprint(history, turns=HISTORY_TURNS):
+    """
+    Fingerprint of the last few user/assistant messages.
+    """
+    recent = [m for m in history if m.get("role") in ("user", "assistant")][-turns:]
+    return "|".join(f"{m['role']}:{normalize(str(m.get('content') or ''))}" for m in recent)
+
+
+def source_stats(paths):
+    """
+    (path, size, mtime) of each source file, used to notice profile changes cheaply.
+    """
+    stats = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stats.append((str(path), stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            stats.append((str(path), None, None))
+    return stats
+
+
+class ResponseCache:
+    """
+    In-memory LRU with TTL in front of an on-disk SQLite store.
+    """
+
+    def __init__(self, namespace, profile_hash, sources=profile_sources,
+                 path=CACHE_PATH, max_entries=512, ttl=CACHE_TTL, enabled=CACHE_ENABLED):
+        self.namespace = namespace
+        self.profile_hash = profile_hash     # ProfileContext.content_hash of the loaded profile
+        self.sources = sources               # () -> the profile's source files
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.enabled = enabled
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "bypassed": 0, "invalidations": 0}
+
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.source_state = source_stats(sources())
+        self.source_checked = time.monotonic()
+        self.stale = False                   # Profile changed on disk since it was loaded
+
+        self.db = None
+        if enabled:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(str(path), check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, namespace TEXT, profile_hash TEXT, reply TEXT, created REAL)"
+            )
+            self.purge_stale()
+
+    # ---------------------------
+    # Keys and invalidation
+    # ---------------------------
+    def key(self, message, history):
+        raw = "\n".join([self.namespace, self.profile_hash, normalize(message), history_fingerprint(history)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def purge_stale(self):
+        """
+        Drops disk entries from an older profile or past their TTL.
+        """
+        with self.lock:
+            self.db.execute(
+                "DELETE FROM responses WHERE namespace = ? AND (profile_hash != ? OR created < ?)",
+                (self.namespace, self.profile_hash, time.time() - self.ttl),
+            )
+            self.db.commit()
+
+    def check_sources(self):
+        """
+        True while the profile files are as they were when the profile was
+        loaded. Once they change, caching stops until a restart reloads the
+        profile (and purge_stale drops the old entries).
+        """
+        if self.stale:
+            return False
+        now = time.monotonic()
+        if now - self.source_checked < SOURCE_CHECK_INTERVAL:
+            return True
+        self.source_checked = now
+        if source_stats(self.sources()) == self.source_state:
+            return True
+        self.stale = True
+        with self.lock:
+            self.memory.clear()
+        self.stats["invalidations"] += 1
+        print(f"⚠️ Profile files changed: {self.namespace} response cache off until restart", flush=True)
+        return False
+
+    # ---------------------------
+    # Lookup and store
+    # ---------------------------
+    def get(self, message, history):
+        """
+        Returns the cached reply or None.
+        """
+        if not self.enabled or not self.check_sources():
+            return None
+        key = self.key(message, history)
+        now = time.time()
+
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry and now - entry[1] < self.ttl:
+                self.memory.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[0]
+
+            row = self.db.execute(
+                "SELECT reply, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] < self.ttl:
+                self._remember(key, row[0], row[1])
+                self.stats["hits"] += 1
+                self.stats["disk_hits"] += 1
+                return row[0]
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, message, history, reply):
+        """
+        Stores a final reply for this message/history.
+        """
+        if not self.enabled or not reply or not self.check_sources():
+            return
+        key = self.key(message, history)
+        now = time.time()
+        with self.lock:
+            self._remember(key, reply, now)
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, namespace, profile_hash, reply, created) VALUES (?, ?, ?, ?, ?)",
+                (key, self.namespace, self.profile_hash, reply, now),
+            )
+            self.db.commit()
+        self.stats["stores"] += 1
+
+    def bypass(self):
+        """
+        Counts a turn that could not be cached (e.g. a tool was called).
+        """
+        self.stats["bypassed"] += 1
+
+    def _remember(self, key, reply, created):
+        self.memory[key] = (reply, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
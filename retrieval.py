@@ -0,0 +1,135 @@
+# ======================================
+# Retrieval over the profile context
+# ======================================
+# Instead of sending the whole LinkedIn dump + summary with every request,
+# the profile is split into chunks once and a BM25 index picks the few
+# chunks relevant to the current message and recent history.
+#
+# PROFILE_CONTEXT_MODE=full       -> whole profile in the system prompt (default)
+# PROFILE_CONTEXT_MODE=retrieval  -> top-k chunks per request
+
+import os
+import re
+from dataclasses import dataclass
+
+import numpy as np
+
+CONTEXT_MODE = os.getenv("PROFILE_CONTEXT_MODE", "full")
+TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+CHUNK_WORDS = 120        # Words per chunk
+CHUNK_OVERLAP = 30       # Words shared between neighbouring chunks
+HISTORY_TURNS = 2        # Recent messages added to the retrieval query
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+@dataclass(frozen=True)
+class Chunk:
+    source: str          # "summary", "linkedin" or a document name
+    text: str
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def chunk_text(text, source, size=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """
+    Splits text into overlapping windows of `size` words.
+    """
+    words = text.split()
+    if not words:
+        return []
+    step = max(1, size - overlap)
+    chunks = []
+    for start in range(0, len(words), step):
+        chunks.append(Chunk(source, " ".join(words[start:start + size])))
+        if start + size >= len(words):
+            break
+    return chunks
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed set of chunks.
+
+    The per-(chunk, term) BM25 weights are precomputed into one matrix, so
+    scoring a query is a single matrix-vector product.
+    """
+
+    def __init__(self, chunks, k1=1.5, b=0.75):
+        self.chunks = list(chunks)
+        docs = [tokenize(chunk.text) for chunk in self.chunks]
+        self.vocab = {term: i for i, term in enumerate(sorted({t for doc in docs for t in doc}))}
+
+        tf = np.zeros((len(docs), len(self.vocab)), dtype=np.float32)
+        for row, doc in enumerate(docs):
+            ids = np.fromiter((self.vocab[t] for t in doc), dtype=np.int64, count=len(doc))
+            tf[row] = np.bincount(ids, minlength=len(self.vocab))
+
+        lengths = tf.sum(axis=1, keepdims=True)
+        avg_length = max(float(lengths.mean()), 1.0) if len(docs) else 1.0
+        df = (tf > 0).sum(axis=0)
+        idf = np.log(1.0 + (len(docs) - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+        norm = k1 * (1.0 - b + b * lengths / avg_length)
+        self.weights = idf * tf * (k1 + 1.0) / (tf + norm)
+
+    def query_vector(self, query):
+        ids = [self.vocab[t] for t in tokenize(query) if t in self.vocab]
+        vector = np.zeros(len(self.vocab), dtype=np.float32)
+        if ids:
+            np.add.at(vector, ids, 1.0)
+        return vector
+
+    def search(self, query, k=TOP_K):
+        """
+        Returns up to k (chunk, score) pairs, best first. Zero-score chunks are dropped.
+        """
+        if not self.chunks:
+            return []
+        scores = self.weights @ self.query_vector(query)
+        k = min(k, len(self.chunks))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.chunks[i], float(scores[i])) for i in top if scores[i] > 0]
+
+
+class ProfileRetriever:
+    """
+    Builds the index over a ProfileContext and formats the retrieved chunks.
+    """
+
+    def __init__(self, profile, k=TOP_K):
+        chunks = chunk_text(profile.summary, "summary") + chunk_text(profile.linkedin, "linkedin")
+        for document in profile.documents:
+            chunks += chunk_text(document.text, document.name)
+        self.index = BM25Index(chunks)
+        self.k = k
+
+    def query_for(self, message, history=()):
+        """
+        The current message plus the last few history messages.
+        """
+        recent = [m["content"] for m in list(history)[-HISTORY_TURNS:] if isinstance(m.get("content"), str)]
+        return " ".join(recent + [message])
+
+    def context_for(self, message, history=()):
+        """
+        Returns a prompt section with the most relevant profile excerpts.
+        """
+        hits = self.index.search(self.query_for(message, history), self.k)
+        if not hits:
+            return ""
+        section = "## Relevant profile excerpts:\n"
+        for chunk, _ in hits:
+            section += f"\n[{chunk.source}] {chunk.text}\n"
+        return section
+
+
+def join_extra(*parts):
+    """
+    Joins the non-empty per-request prompt sections (or returns None).
+    """
+    parts = [part for part in parts if part]
+    return "\n\n".join(parts) if parts else None
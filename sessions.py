@@ -0,0 +1,246 @@
+# ======================================
+# Server-side chat sessions
+# ======================================
+# Gradio sends the whole history on every turn, and the chat loops used to
+# rebuild everything from it. SessionStore keeps each conversation on the
+# server instead, keyed by session id (gr.Request.session_hash in the UI, a
+# client-chosen id on /api/chat):
+# - messages are kept in OpenAI format, tool calls and tool results
+#   included, and each turn only appends its new messages
+# - an in-memory LRU of recent sessions sits in front of a SQLite file in
+#   WAL mode, so sessions survive restarts and several worker processes can
+#   share it (SQLite is only read when a session is not in memory)
+# - the stored session follows what the client shows: when Gradio's Clear,
+#   Undo or Retry shortens or changes the visible history, the session is
+#   cut back to the part that still matches before the turn is added
+# - sessions idle for longer than SESSION_IDLE_TTL are evicted
+#
+# Calls without a session id (scripts, benchmarks) keep using the history
+# they were given. /api/chat clients that send no history at all
+# (history=None) get the stored session as is.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+SESSION_PATH = Path(os.getenv("SESSION_STORE_PATH", ".cache/sessions.sqlite3"))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", str(24 * 3600)))   # Seconds
+SESSIONS_ENABLED = os.getenv("SESSION_STORE", "1") == "1"
+EVICT_EVERY = 60.0          # Seconds between idle sweeps
+
+# Message fields worth keeping (everything else Gradio adds is dropped)
+KEPT_FIELDS = ("tool_calls", "tool_call_id", "name")
+
+
+def compact_message(message):
+    """
+    Plain dict with only role, content and the tool fields.
+    """
+    if not isinstance(message, dict):                 # SDK message objects
+        message = message.model_dump(exclude_none=True)
+    compact = {"role": message["role"], "content": message.get("content")}
+    for field in KEPT_FIELDS:
+        if message.get(field):
+            compact[field] = message[field]
+    return compact
+
+
+def visible_text(message):
+    """
+    Text of a message the chat UI shows (user/assistant text), else None.
+    """
+    if message.get("role") not in ("user", "assistant") or message.get("tool_calls"):
+        return None
+    content = message.get("content")
+    if isinstance(content, list):                     # Content parts
+        content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content.strip() if isinstance(content, str) and content.strip() else None
+
+
+def session_id_of(request):
+    """
+    Session id for a Gradio request (None outside the web UI).
+    """
+    return getattr(request, "session_hash", None) if request is not None else None
+
+
+class SessionStore:
+    """
+    Append-only message log per session, cached in memory and kept in SQLite.
+    """
+
+    def __init__(self, namespace, path=SESSION_PATH, max_sessions=1024,
+                 idle_ttl=SESSION_IDLE_TTL, enabled=SESSIONS_ENABLED):
+        self.namespace = namespace
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.enabled = enabled
+        self.memory = OrderedDict()        # session id -> list of messages
+        self.lock = threading.Lock()
+        self.last_sweep = 0.0
+        self.stats = {"loads": 0, "appended": 0, "truncated": 0, "evicted": 0}
+
+        self.db = None
+        if enabled:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(str(path), check_same_thread=False, timeout=10)
+            self.db.execute("PRAGMA journal_mode=WAL")           # Readers never block the writer
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "namespace TEXT, session TEXT, seq INTEGER, message TEXT, "
+                "PRIMARY KEY (namespace, session, seq))"
+            )
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "namespace TEXT, session TEXT, last_seen REAL, PRIMARY KEY (namespace, session))"
+            )
+            self.db.commit()
+
+    # ---------------------------
+    # Reading
+    # ---------------------------
+    def messages(self, session_id, refresh=False):
+        """
+        All messages of a session, oldest first (empty for a new session).
+        SQLite is read when the session is not in memory, or with refresh=True
+        for rows other workers appended since.
+        """
+        with self.lock:
+            messages = self.memory.get(session_id)
+            if messages is None:                      # Not in this process yet (or evicted)
+                messages = []
+                self.stats["loads"] += 1
+                refresh = True
+            if refresh:
+                rows = self.db.execute(
+                    "SELECT message FROM messages WHERE namespace = ? AND session = ? AND seq >= ? ORDER BY seq",
+                    (self.namespace, session_id, len(messages)),
+                ).fetchall()
+                messages.extend(json.loads(row[0]) for row in rows)
+            self._remember(session_id, messages)
+            return list(messages)
+
+    def history(self, session_id, client_history):
+        """
+        The history to use for this turn: the stored session, reconciled with
+        the history the client sent (None = trust the store). Without a
+        session id the client's history is used as is.
+        """
+        if not self.enabled or session_id is None:
+            return client_history if client_history is not None else []
+        if client_history is None:
+            return self.messages(session_id, refresh=True)   # /api/chat may hop between workers
+        stored = self.messages(session_id)
+
+        client = [compact_message(m) for m in client_history]
+        client = [{"role": m["role"], "content": visible_text(m)} for m in client if visible_text(m) is not None]
+        matched, positions = self._match(stored, client)
+        if matched == len(positions) == len(client):
+            return stored                                 # The usual case: nothing changed
+
+        # Another worker may have added turns: compare with the file before changing anything
+        stored = self.messages(session_id, refresh=True)
+        matched, positions = self._match(stored, client)
+        if matched == len(positions) == len(client):
+            return stored
+
+        # Cleared, undone, retried or edited: keep the matching part (with its
+        # tool messages) and take the rest from the client
+        cut = positions[matched - 1] + 1 if matched else 0
+        if matched == len(positions):
+            cut = len(stored)                             # Client is ahead (history from before the store)
+        self.truncate(session_id, cut)
+        self.append(session_id, *client[matched:])
+        return self.messages(session_id)
+
+    def _match(self, stored, client):
+        """
+        (how many visible messages of the session match the client's, positions of
+        the visible messages in the session)
+        """
+        positions = [i for i, m in enumerate(stored) if visible_text(m) is not None]
+        matched = 0
+        for i, m in zip(positions, client):
+            if (stored[i]["role"], visible_text(stored[i])) != (m["role"], m["content"]):
+                break
+            matched += 1
+        return matched, positions
+
+    # ---------------------------
+    # Writing
+    # ---------------------------
+    def append(self, session_id, *messages):
+        """
+        Appends the new messages of a turn to the session.
+        """
+        if not self.enabled or session_id is None or not messages:
+            return
+        compact = [compact_message(m) for m in messages]
+        now = time.time()
+        with self.lock:
+            stored = self.memory.get(session_id)
+            if stored is None:
+                stored = []
+            start = self.db.execute(
+                "SELECT COALESCE(MAX(seq) + 1, 0) FROM messages WHERE namespace = ? AND session = ?",
+                (self.namespace, session_id),
+            ).fetchone()[0]
+            with self.db:
+                self.db.executemany(
+                    "INSERT INTO messages (namespace, session, seq, message) VALUES (?, ?, ?, ?)",
+                    [(self.namespace, session_id, start + i, json.dumps(m)) for i, m in enumerate(compact)],
+                )
+                self.db.execute(
+                    "INSERT OR REPLACE INTO sessions (namespace, session, last_seen) VALUES (?, ?, ?)",
+                    (self.namespace, session_id, now),
+                )
+            if len(stored) == start:
+                stored.extend(compact)
+                self._remember(session_id, stored)
+            else:
+                self.memory.pop(session_id, None)      # Out of step with the file: reload next time
+            self.stats["appended"] += len(compact)
+        if now - self.last_sweep > EVICT_EVERY:
+            self.evict_idle()
+
+    def truncate(self, session_id, length):
+        """
+        Drops every message of a session after the first `length`.
+        """
+        with self.lock, self.db:
+            self.db.execute(
+                "DELETE FROM messages WHERE namespace = ? AND session = ? AND seq >= ?",
+                (self.namespace, session_id, length),
+            )
+            stored = self.memory.get(session_id)
+            if stored is not None:
+                del stored[length:]
+            self.stats["truncated"] += 1
+
+    def evict_idle(self):
+        """
+        Deletes sessions that have been idle for longer than idle_ttl.
+        """
+        now = time.time()
+        self.last_sweep = now
+        cutoff = now - self.idle_ttl
+        with self.lock, self.db:
+            idle = [row[0] for row in self.db.execute(
+                "SELECT session FROM sessions WHERE namespace = ? AND last_seen < ?", (self.namespace, cutoff)
+            )]
+            for session_id in idle:
+                self.db.execute("DELETE FROM messages WHERE namespace = ? AND session = ?", (self.namespace, session_id))
+                self.memory.pop(session_id, None)
+            self.db.execute("DELETE FROM sessions WHERE namespace = ? AND last_seen < ?", (self.namespace, cutoff))
+            self.stats["evicted"] += len(idle)
+
+    def _remember(self, session_id, messages):
+        self.memory[session_id] = messages
+        self.memory.move_to_end(session_id)
+        while len(self.memory) > self.max_sessions:
+            self.memory.popitem(last=False)
@@ -0,0 +1,47 @@
+from dataclasses import dataclass
+
+from evaluator_gate import EvaluatorGate
+
+PROFILE = "Software engineer at AssetCues. Builds CI/CD pipelines with Docker and Azure DevOps."
+
+
+@dataclass
+class Evaluation:
+    is_acceptable: bool
+    feedback: str
+
+
+def make_gate(remote_calls):
+    def remote(reply, message, history, **kwargs):
+        remote_calls.append(reply)
+        return Evaluation(is_acceptable=True, feedback="ok")
+
+    return EvaluatorGate(PROFILE, remote=remote, verdict=Evaluation, audit_rate=0.0, enabled=True)
+
+
+def stream(monitor, reply):
+    """
+    Feeds the reply word by word, as it would stream in; returns the abort reason or None.
+    """
+    text = ""
+    for word in reply.split(" "):
+        text += word + " "
+        if monitor.feed(text):
+            return monitor.violation
+    return None
+
+
+def test_one_fabricated_employer_aborts_the_stream():
+    monitor = make_gate([]).monitor("Where have you worked?", [])
+    violation = stream(monitor, "I worked at Google for three years. Then I moved on to other things.")
+    assert violation is not None and "Google" in violation
+
+
+def test_employer_from_the_profile_does_not_abort():
+    monitor = make_gate([]).monitor("Where do you work?", [])
+    assert stream(monitor, "I joined AssetCues as a software engineer. I build pipelines there.") is None
+
+
+def test_ordinary_sentence_does_not_abort():
+    monitor = make_gate([]).monitor("What tools do you use?", [])
+    assert stream(monitor, "In my current role I mostly use Docker. It keeps builds repeatable.") is None
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+import hedging
+from rate_limits import scheduler
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture
+def routes(monkeypatch):
+    """
+    Replaces HedgedChat._open with canned results per provider; every provider has a key.
+    """
+    results = {}
+
+    async def _open(self, route, kwargs, stream):
+        await asyncio.sleep(0.01)
+        result = results[route.provider]
+        if isinstance(result, Exception):
+            raise result
+        return route, result, None, 0.01
+
+    monkeypatch.setattr(hedging.HedgedChat, "_open", _open)
+    for name in ("OPENAI_API_KEY", "GROQ_API_KEY", "GOOGLE_API_KEY"):
+        monkeypatch.setenv(name, "test")
+    return results
+
+
+def run(results, **kwargs):
+    chat = hedging.HedgedChat(backups=hedging.parse_routes("groq:a,gemini:b"))
+    return asyncio.run(chat.create(model="x", messages=[], **kwargs))
+
+
+def test_bad_request_from_the_primary_is_raised(routes):
+    routes.update(openai=StatusError(400), groq="groq", gemini="gemini")
+    with pytest.raises(StatusError, match="400"):
+        run(routes)
+
+
+def test_backup_errors_fail_over_to_the_next_backup(routes):
+    routes.update(openai=StatusError(500), groq=StatusError(413), gemini="gemini")
+    assert run(routes) == "gemini"
+
+
+def test_backup_error_while_the_primary_is_paused_fails_over(routes, monkeypatch):
+    monkeypatch.setattr(scheduler, "paused_for", lambda provider: 5.0 if provider == "openai" else 0.0)
+    routes.update(openai="openai", groq=StatusError(401), gemini="gemini")
+    assert run(routes) == "gemini"
+
+
+def test_primary_error_is_reported_when_every_route_fails(routes):
+    routes.update(openai=StatusError(503), groq=StatusError(401), gemini=StatusError(500))
+    with pytest.raises(StatusError, match="503"):
+        run(routes)
+
+
+def test_backups_without_an_api_key_are_skipped(routes, monkeypatch):
+    monkeypatch.delenv("GROQ_API_KEY")
+    routes.update(openai=StatusError(500), groq="groq", gemini="gemini")
+    assert run(routes) == "gemini"
@@ -0,0 +1,25 @@
+import time
+
+from notifications import NotificationDispatcher
+
+
+def test_spilled_messages_are_retried_while_idle(tmp_path):
+    dispatcher = NotificationDispatcher(url="http://127.0.0.1:9", token="t", user="u", batch_window=0.01,
+                                        max_retries=0, spill_file=tmp_path / "spill.jsonl", spill_retry=0.2)
+    posted = []
+
+    def post(message):
+        posted.append(message)
+        return len(posted) > 1                  # The endpoint is down for the first attempt only
+
+    dispatcher._post = post
+    dispatcher.send("hello")
+
+    deadline = time.monotonic() + 5.0
+    while dispatcher.stats["sent_messages"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    dispatcher.close()
+
+    assert posted == ["hello", "hello"]
+    assert dispatcher.stats["sent_messages"] == 1 and dispatcher.stats["spilled"] == 1
+    assert not (tmp_path / "spill.jsonl").exists()
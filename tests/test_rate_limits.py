@@ -0,0 +1,33 @@
+import threading
+
+from rate_limits import BATCH, BATCH_HEADROOM, RateLimitScheduler, TokenBucket
+
+
+def test_oversized_batch_call_is_admitted_after_slow_down_and_recover():
+    # 40000 * 0.75 * 1.05**4 leaves a rate where rate * (1 - reserve) + reserve * rate
+    # is not exactly rate in floating point
+    scheduler = RateLimitScheduler()
+    state = scheduler.state("anthropic")
+    state.tokens = TokenBucket(40_000)
+    state.tokens.slow_down()
+    for _ in range(4):
+        state.tokens.recover()
+    state.tokens.level = state.tokens.rate
+    assert state.tokens.wait_for(10 ** 9, BATCH_HEADROOM) == 0.0
+
+    admitted = threading.Event()
+
+    def acquire():
+        scheduler.acquire("anthropic", BATCH, tokens=10 ** 9)
+        admitted.set()
+
+    threading.Thread(target=acquire, daemon=True).start()
+    assert admitted.wait(timeout=5.0)
+
+
+def test_oversized_batch_call_waits_for_a_full_bucket():
+    bucket = TokenBucket(600)
+    bucket.level = 300
+    assert bucket.wait_for(10_000, BATCH_HEADROOM) == 30.0
+    bucket.level = 600
+    assert bucket.wait_for(10_000, BATCH_HEADROOM) == 0.0
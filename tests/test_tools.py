@@ -0,0 +1,34 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from tools import ToolRegistry
+
+
+def make_registry():
+    registry = ToolRegistry()
+
+    @registry.tool(description="Echoes its argument")
+    def echo(text: str):
+        return {"echo": text}
+
+    return registry
+
+
+def tool_call(call_id, arguments):
+    return SimpleNamespace(id=call_id, function=SimpleNamespace(name="echo", arguments=arguments))
+
+
+CALLS = [tool_call("bad", '{"text": "unterminated'), tool_call("good", '{"text": "hi"}')]
+
+
+def test_malformed_arguments_give_an_error_result():
+    results = make_registry().handle_tool_calls(CALLS)
+    assert [r["tool_call_id"] for r in results] == ["bad", "good"]
+    assert json.loads(results[0]["content"])["error"].startswith("JSONDecodeError")
+    assert json.loads(results[1]["content"]) == {"echo": "hi"}
+
+
+def test_sync_and_async_paths_return_the_same_messages():
+    registry = make_registry()
+    assert registry.handle_tool_calls(CALLS) == asyncio.run(registry.ahandle_tool_calls(CALLS))
@@ -0,0 +1,23 @@
+import tracing
+from tracing import JsonlExporter, start_span
+
+
+def export(exporter, count):
+    for _ in range(count):
+        finished = start_span("test")
+        finished.finish()
+        exporter.export(finished)
+    exporter.flush()
+
+
+def test_trace_file_rolls_over_by_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "exporter", None)       # Keep the test spans out of TRACE_FILE
+    path = tmp_path / "traces.jsonl"
+    exporter = JsonlExporter(path, max_bytes=2000, backups=2)
+    for _ in range(12):
+        export(exporter, 5)
+
+    kept = sorted(p.name for p in tmp_path.iterdir())
+    assert kept == ["traces.jsonl", "traces.jsonl.1", "traces.jsonl.2"]
+    for p in tmp_path.iterdir():
+        assert p.stat().st_size < 2000 + 2000      # At most one batch past the limit
@@ -0,0 +1,174 @@
+# ======================================
+# Tool registry for GPT function calling
+# ======================================
+# Register a plain Python function with @registry.tool(...) and the JSON
+# schema is generated from its signature:
+# - parameter types come from the annotations (str -> "string", ...)
+# - parameter descriptions come from Annotated[str, "description"]
+# - parameters without a default are required
+#
+# All tool calls from one assistant turn run concurrently on a thread pool,
+# each with its own timeout, and results come back in tool_call order.
+# `async def` tools are supported too; ahandle_tool_calls() awaits them on
+# the event loop and runs plain functions in worker threads.
+
+import asyncio
+import contextvars
+import inspect
+import json
+import time
+import typing
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from tracing import span
+
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+
+
+def parameter_schema(annotation):
+    """
+    Turns a parameter annotation into a JSON schema property.
+    """
+    description = None
+    if typing.get_origin(annotation) is typing.Annotated:
+        annotation, *metadata = typing.get_args(annotation)
+        description = next((m for m in metadata if isinstance(m, str)), None)
+
+    schema = {"type": JSON_TYPES.get(typing.get_origin(annotation) or annotation, "string")}
+    if description:
+        schema["description"] = description
+    return schema
+
+
+def function_schema(fn, name=None, description=None):
+    """
+    Builds an OpenAI function schema from a function's signature.
+    """
+    hints = typing.get_type_hints(fn, include_extras=True)
+    properties, required = {}, []
+    for param in inspect.signature(fn).parameters.values():
+        properties[param.name] = parameter_schema(hints.get(param.name, str))
+        if param.default is inspect.Parameter.empty:
+            required.append(param.name)
+
+    return {
+        "name": name or fn.__name__,
+        "description": description or inspect.getdoc(fn) or "",
+        "parameters": {
+            "type": "object",
+            "properties": properties,
+            "required": required,
+            "additionalProperties": False,
+        },
+    }
+
+
+class ToolRegistry:
+    """
+    Maps tool names to Python functions and runs tool calls in parallel.
+    """
+
+    def __init__(self, max_workers=8, default_timeout=10.0):
+        self.functions = {}
+        self.schemas = {}
+        self.timeouts = {}
+        self.default_timeout = default_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    def tool(self, fn=None, *, name=None, description=None, timeout=None):
+        """
+        Decorator that registers a function as a tool.
+        """
+        def register(fn):
+            tool_name = name or fn.__name__
+            self.functions[tool_name] = fn
+            self.schemas[tool_name] = function_schema(fn, tool_name, description)
+            self.timeouts[tool_name] = timeout or self.default_timeout
+            return fn
+
+        return register(fn) if fn is not None else register
+
+    def openai_tools(self):
+        """
+        The `tools` list for chat.completions.create.
+        """
+        return [{"type": "function", "function": schema} for schema in self.schemas.values()]
+
+    def call(self, tool_name, arguments, queued_since=None):
+        """
+        Runs one tool by name (unknown tools return an empty result).
+        """
+        print(f"Tool called: {tool_name}", flush=True)
+        with span(tool_name, kind="tool", queued_since=queued_since):
+            tool = self.functions.get(tool_name)
+            if tool is None:
+                return {}
+            if inspect.iscoroutinefunction(tool):
+                return asyncio.run(tool(**arguments))    # Async tool on the sync path (worker thread)
+            return tool(**arguments)
+
+    async def acall(self, tool_name, arguments, queued_since=None):
+        """
+        Async version of call(): awaits async tools, runs plain ones in a thread.
+        """
+        tool = self.functions.get(tool_name)
+        if tool is None or not inspect.iscoroutinefunction(tool):
+            return await asyncio.to_thread(self.call, tool_name, arguments, queued_since)
+        print(f"Tool called: {tool_name}", flush=True)
+        with span(tool_name, kind="tool", queued_since=queued_since):
+            return await tool(**arguments)
+
+    def handle_tool_calls(self, tool_calls):
+        """
+        Runs every tool call concurrently and returns the tool messages in
+        the same order as `tool_calls`. A tool that raises or runs past its
+        timeout gets an error result instead of blocking the others.
+        """
+        start = time.monotonic()
+        futures = []
+        for tool_call in tool_calls:
+            tool_name = tool_call.function.name
+            try:
+                arguments = json.loads(tool_call.function.arguments or "{}")
+            except ValueError as e:                   # Malformed arguments from the model: an error result
+                futures.append(Future())
+                futures[-1].set_exception(e)
+                continue
+            context = contextvars.copy_context()      # Keep the caller's trace in the worker thread
+            futures.append(self.executor.submit(context.run, self.call, tool_name, arguments, time.perf_counter()))
+
+        results = []
+        for tool_call, future in zip(tool_calls, futures):
+            deadline = start + self.timeouts.get(tool_call.function.name, self.default_timeout)
+            try:
+                result = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeout:
+                result = {"error": f"{tool_call.function.name} timed out"}
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}"}
+
+            results.append({
+                "role": "tool",
+                "content": json.dumps(result),
+                "tool_call_id": tool_call.id
+            })
+        return results
+
+    async def ahandle_tool_calls(self, tool_calls):
+        """
+        Async version of handle_tool_calls(), for use on an event loop.
+        """
+        async def run(tool_call):
+            tool_name = tool_call.function.name
+            timeout = self.timeouts.get(tool_name, self.default_timeout)
+            try:
+                arguments = json.loads(tool_call.function.arguments or "{}")
+                result = await asyncio.wait_for(self.acall(tool_name, arguments, time.perf_counter()), timeout)
+            except asyncio.TimeoutError:
+                result = {"error": f"{tool_name} timed out"}
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}"}
+            return {"role": "tool", "content": json.dumps(result), "tool_call_id": tool_call.id}
+
+        return list(await asyncio.gather(*(run(tool_call) for tool_call in tool_calls)))
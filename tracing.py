@@ -0,0 +1,378 @@
+# ======================================
+# Lightweight tracing and token/cost metrics
+# ======================================
+# Wrap any model call, tool execution, evaluation or judge call in a span:
+#
+#     with span("chat", kind="model", provider="openai", model="gpt-4o-mini") as s:
+#         response = client.chat.completions.create(...)
+#         s.record_usage(response.usage)
+#
+# Each span records wall time, time spent queueing before it started
+# (`queued_since`), prompt/completion/cached tokens and an estimated cost.
+# Spans nest through contextvars, so a chat turn and everything it triggers
+# share one trace id.
+#
+# Finished spans are:
+# - appended to TRACE_FILE as JSONL by a background writer (batched, so the
+#   request path never waits on disk). Once the file reaches TRACE_MAX_BYTES
+#   it is rolled over to TRACE_FILE.1 (older files shift up to
+#   TRACE_FILE.<TRACE_BACKUPS>, the oldest is deleted)
+# - aggregated into in-memory counters served as Prometheus text on
+#   METRICS_PORT (if set), or via metrics.render()
+
+import atexit
+import contextvars
+import functools
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+TRACE_FILE = os.getenv("TRACE_FILE", ".cache/traces.jsonl")     # Empty string disables the file
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))   # 0 = never roll over
+TRACE_BACKUPS = int(os.getenv("TRACE_BACKUPS", "3"))             # Rolled-over files kept
+METRICS_PORT = os.getenv("METRICS_PORT")                          # e.g. 9464
+
+# Estimated USD per 1M tokens: (input, cached input, output)
+PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+    "o3-mini": (1.10, 0.55, 4.40),
+    "claude-3-7-sonnet-latest": (3.00, 0.30, 15.00),
+    "gemini-2.0-flash": (0.10, 0.025, 0.40),
+    "deepseek-chat": (0.27, 0.07, 1.10),
+    "llama-3.3-70b-versatile": (0.59, 0.59, 0.79),
+}
+
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+def estimate_cost(model, prompt_tokens, cached_tokens, completion_tokens):
+    price = PRICES.get(model)
+    if not price:
+        return 0.0
+    uncached = max(0, prompt_tokens - cached_tokens)
+    return (uncached * price[0] + cached_tokens * price[1] + completion_tokens * price[2]) / 1_000_000
+
+
+class Span:
+    __slots__ = ("name", "kind", "provider", "model", "trace_id", "span_id", "parent_id",
+                 "start", "queued", "duration", "error", "attrs", "started", "finished",
+                 "prompt_tokens", "completion_tokens", "cached_tokens")
+
+    def __init__(self, name, kind, provider, model, parent, queued, attrs):
+        self.name = name
+        self.kind = kind
+        self.provider = provider
+        self.model = model
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.finished = False
+        self.queued = queued
+        self.duration = 0.0
+        self.error = None
+        self.attrs = attrs
+        self.prompt_tokens = self.completion_tokens = self.cached_tokens = 0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def record_usage(self, usage):
+        """
+        Adds token counts from an OpenAI- or Anthropic-style usage object.
+        """
+        if usage is None:
+            return
+        if hasattr(usage, "input_tokens"):                     # Anthropic
+            self.prompt_tokens += usage.input_tokens or 0
+            self.completion_tokens += usage.output_tokens or 0
+            self.cached_tokens += getattr(usage, "cache_read_input_tokens", 0) or 0
+            return
+        self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+        self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.cached_tokens += (getattr(details, "cached_tokens", 0) or 0) if details else 0
+
+    def finish(self, error=None):
+        """
+        Ends the span and hands it to the metrics and the exporter (once).
+        """
+        if self.finished:
+            return
+        self.finished = True
+        self.duration = time.perf_counter() - self.started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"[:500]
+        metrics.observe(self)
+        if exporter:
+            exporter.export(self)             # Serialised on the writer thread
+
+    @property
+    def cost(self):
+        return estimate_cost(self.model, self.prompt_tokens, self.cached_tokens, self.completion_tokens)
+
+    def to_dict(self):
+        record = {
+            "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+            "name": self.name, "kind": self.kind, "provider": self.provider, "model": self.model,
+            "start": self.start, "duration_ms": round(self.duration * 1000, 3),
+            "queued_ms": round(self.queued * 1000, 3),
+        }
+        if self.prompt_tokens or self.completion_tokens:
+            record.update(prompt_tokens=self.prompt_tokens, completion_tokens=self.completion_tokens,
+                          cached_tokens=self.cached_tokens, cost_usd=round(self.cost, 8))
+        if self.error:
+            record["error"] = self.error
+        if self.attrs:
+            record["attrs"] = self.attrs
+        return record
+
+
+# ---------------------------
+# Aggregated metrics
+# ---------------------------
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(lambda: defaultdict(float))
+        self.buckets = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))
+
+    def observe(self, span):
+        key = (span.kind, span.name, span.provider or "", span.model or "")
+        with self.lock:
+            c = self.counters[key]
+            c["count"] += 1
+            c["errors"] += 1 if span.error else 0
+            c["duration_seconds"] += span.duration
+            c["queued_seconds"] += span.queued
+            c["prompt_tokens"] += span.prompt_tokens
+            c["completion_tokens"] += span.completion_tokens
+            c["cached_tokens"] += span.cached_tokens
+            c["cost_usd"] += span.cost
+            buckets = self.buckets[key]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.duration <= bound:
+                    buckets[i] += 1
+                    break
+            else:
+                buckets[-1] += 1
+
+    def render(self):
+        """
+        Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            items = [(key, dict(c), list(self.buckets[key])) for key, c in self.counters.items()]
+        for metric in ("count", "errors", "duration_seconds", "queued_seconds", "prompt_tokens",
+                       "completion_tokens", "cached_tokens", "cost_usd"):
+            lines.append(f"# TYPE llm_span_{metric}_total counter")
+            for key, c, _ in items:
+                lines.append(f"llm_span_{metric}_total{{{labels(key)}}} {c[metric]}")
+        lines.append("# TYPE llm_span_duration_seconds histogram")
+        for key, c, buckets in items:
+            cumulative = 0
+            for bound, n in zip(DURATION_BUCKETS, buckets):
+                cumulative += n
+                lines.append(f'llm_span_duration_seconds_bucket{{{labels(key)},le="{bound}"}} {cumulative}')
+            lines.append(f'llm_span_duration_seconds_bucket{{{labels(key)},le="+Inf"}} {int(c["count"])}')
+            lines.append(f"llm_span_duration_seconds_sum{{{labels(key)}}} {c['duration_seconds']}")
+            lines.append(f"llm_span_duration_seconds_count{{{labels(key)}}} {int(c['count'])}")
+        return "\n".join(lines) + "\n"
+
+
+def labels(key):
+    kind, name, provider, model = key
+    return f'kind="{kind}",name="{name}",provider="{provider}",model="{model}"'
+
+
+metrics = Metrics()
+
+
+# ---------------------------
+# JSONL exporter
+# ---------------------------
+class JsonlExporter:
+    """
+    Writes finished spans to a JSONL file from a background thread, rolling
+    it over by size.
+    """
+
+    def __init__(self, path, max_bytes=TRACE_MAX_BYTES, backups=TRACE_BACKUPS):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue = queue.Queue(maxsize=10000)
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def export(self, finished):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="trace-writer", daemon=True)
+                    self.thread.start()
+        try:
+            self.queue.put_nowait(finished)
+        except queue.Full:
+            pass                       # Never slow the request path down for tracing
+
+    def _run(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < 500:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.roll_over()
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(finished.to_dict()) + "\n" for finished in batch))
+            except OSError as e:
+                print(f"⚠️ Could not write traces to {self.path}: {e}", flush=True)
+            for _ in batch:
+                self.queue.task_done()
+
+    def roll_over(self):
+        """
+        Renames a full trace file to <path>.1, shifting older ones up and dropping the last.
+        """
+        if not self.max_bytes:
+            return
+        try:
+            if self.path.stat().st_size < self.max_bytes:
+                return
+        except FileNotFoundError:
+            return
+        for n in range(self.backups - 1, 0, -1):
+            older = self.path.with_name(f"{self.path.name}.{n}")
+            if older.exists():
+                os.replace(older, self.path.with_name(f"{self.path.name}.{n + 1}"))
+        if self.backups:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+
+    def flush(self, timeout=2.0):
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+
+exporter = JsonlExporter(TRACE_FILE) if TRACE_FILE else None
+if exporter:
+    atexit.register(exporter.flush)
+
+
+# ---------------------------
+# Span API
+# ---------------------------
+def start_span(name, kind="internal", provider=None, model=None, queued_since=None, parent=None, **attrs):
+    """
+    Starts a span without making it current; call .finish() when done.
+    Useful in generators, where a `with` block would span several yields.
+    """
+    started = time.perf_counter()
+    queued = started - queued_since if queued_since is not None else 0.0
+    return Span(name, kind, provider, model, parent or _current.get(), queued, attrs)
+
+
+@contextmanager
+def activate(current):
+    """
+    Makes `current` the parent of spans started inside the block.
+    """
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name, kind="internal", provider=None, model=None, queued_since=None, **attrs):
+    """
+    Times the block as a span. `queued_since` is a time.perf_counter() value
+    taken when the work was requested, to record how long it waited to start.
+    """
+    current = start_span(name, kind, provider, model, queued_since, **attrs)
+    try:
+        with activate(current):
+            yield current
+    except BaseException as e:
+        current.finish(e)
+        raise
+    current.finish()
+
+
+def current_span():
+    return _current.get()
+
+
+def record_usage(usage):
+    """
+    Adds a response's token usage to the current span (if there is one).
+    """
+    current = _current.get()
+    if current is not None:
+        current.record_usage(usage)
+
+
+def traced(name=None, kind="internal"):
+    """
+    Decorator form of span() for plain functions.
+    """
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name or fn.__name__, kind=kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+# ---------------------------
+# Prometheus endpoint
+# ---------------------------
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port=None, host="0.0.0.0"):
+    """
+    Serves /metrics in Prometheus text format on a background thread (once).
+    """
+    global _metrics_server
+    port = port or METRICS_PORT
+    if _metrics_server is not None or not port:
+        return _metrics_server
+    _metrics_server = ThreadingHTTPServer((host, int(port)), MetricsHandler)
+    _metrics_server.daemon_threads = True
+    threading.Thread(target=_metrics_server.serve_forever, name="metrics", daemon=True).start()
+    return _metrics_server